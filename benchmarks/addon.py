@@ -0,0 +1,72 @@
+import importlib.util
+import os
+import subprocess
+import sys
+
+import bpy
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "fg_rig_tools"
+
+
+# ------------------- add-on --------------#
+# The checkout folder name is not a valid module name, the benchmarks and the farm
+# worker import it under a fixed package name instead
+def load_addon(register=True):
+    """Import the add-on from this checkout as PACKAGE and register it."""
+    if PACKAGE in sys.modules:
+        return sys.modules[PACKAGE]
+    spec = importlib.util.spec_from_file_location(PACKAGE, os.path.join(ROOT, "__init__.py"), submodule_search_locations=[ROOT])
+    addon = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE] = addon
+    spec.loader.exec_module(addon)
+    if register:
+        addon.register()
+    return addon
+
+
+def commit():
+    """Short hash of the checked out commit, empty outside a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def parse_size(text):
+    """Vertex count from text like 500, 10k or 2m."""
+    text = text.strip().lower()
+    scale = {"k": 1000, "m": 1000000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+# ------------------- context --------------#
+# In background mode there is no active area, operators that read screen context
+# members (active bone, selected bones) get a 3D view of the first window if any
+def view3d_override():
+    for window in bpy.context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type == "VIEW_3D":
+                region = next(r for r in area.regions if r.type == "WINDOW")
+                return {"window": window, "area": area, "region": region}
+    return {}
+
+
+def activate(obj, mode="OBJECT"):
+    """Make obj the only selected and active object, in mode."""
+    if bpy.context.object and bpy.context.object.mode != "OBJECT":
+        bpy.ops.object.mode_set(mode="OBJECT")
+    view_layer = bpy.context.view_layer
+    for other in view_layer.objects:
+        other.select_set(False)
+    view_layer.objects.active = obj
+    obj.select_set(True)
+    if mode != "OBJECT":
+        bpy.ops.object.mode_set(mode=mode)
+
+
+def select_bones(armature, names, active=None):
+    for bone in armature.data.bones:
+        bone.select = bone.select_head = bone.select_tail = bone.name in names
+    if active:
+        armature.data.bones.active = armature.data.bones[active]
@@ -0,0 +1,52 @@
+"""Compare two benchmark result files written by benchmarks/run.py.
+
+    python benchmarks/compare.py base.json new.json --threshold 1.1
+
+Prints the median time of every operator per mesh size and the new/base ratio,
+exits with 1 when an operator got slower than the threshold.
+"""
+
+import argparse
+import json
+import sys
+
+
+def rows(base, new):
+    for size, entry in new["sizes"].items():
+        old_ops = base["sizes"].get(size, {}).get("operators", {})
+        for label, result in entry["operators"].items():
+            old = old_ops.get(label, {}).get("median_ms")
+            yield size, label, old, result.get("median_ms"), result.get("error", "")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=1.1, help="new/base ratio counted as a regression")
+    args = parser.parse_args(argv)
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    print(f"base {base.get('commit') or args.base}  new {new.get('commit') or args.new}")
+    print(f"{'vertices':>9} {'operator':<28} {'base ms':>10} {'new ms':>10} {'ratio':>7}")
+    regressions = 0
+    for size, label, old, cur, error in rows(base, new):
+        if old is None or cur is None:
+            ratio = ""
+            flag = error or ("new" if old is None else "")
+        else:
+            value = cur / max(old, 1e-9)
+            ratio = f"{value:.2f}"
+            flag = "SLOWER" if value > args.threshold else ("faster" if value < 1 / args.threshold else "")
+            regressions += value > args.threshold
+        old_text = f"{old:.1f}" if old is not None else "-"
+        cur_text = f"{cur:.1f}" if cur is not None else "-"
+        print(f"{size:>9} {label:<28} {old_text:>10} {cur_text:>10} {ratio:>7} {flag}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
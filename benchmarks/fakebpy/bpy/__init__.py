@@ -0,0 +1,123 @@
+"""Stand-in for the bpy module, enough to import the add-on under plain CPython.
+
+Classes register to nothing, properties are recorded but never become RNA
+properties and operators cannot be run. Only meant for the microbenchmarks of
+the numeric core, see benchmarks/micro.py.
+"""
+
+import sys
+import types as _types
+
+
+def _module(name):
+    module = _types.ModuleType(name)
+    sys.modules[name] = module
+    return module
+
+
+# ------------------- bpy.types --------------#
+types = _module("bpy.types")
+
+
+class bpy_struct:
+    pass
+
+
+def _types_getattr(name):
+    cls = type(name, (bpy_struct,), {"__module__": "bpy.types"})
+    setattr(types, name, cls)
+    return cls
+
+
+types.bpy_struct = bpy_struct
+types.__getattr__ = _types_getattr
+
+
+# ------------------- bpy.props --------------#
+props = _module("bpy.props")
+
+
+class _PropertyDeferred:
+    def __init__(self, function, keywords):
+        self.function = function
+        self.keywords = keywords
+
+    def __repr__(self):
+        return f"<{self.function} {self.keywords}>"
+
+
+def _property(kind):
+    def function(**keywords):
+        return _PropertyDeferred(kind, keywords)
+
+    function.__name__ = kind
+    return function
+
+
+for _kind in (
+    "BoolProperty",
+    "BoolVectorProperty",
+    "CollectionProperty",
+    "EnumProperty",
+    "FloatProperty",
+    "FloatVectorProperty",
+    "IntProperty",
+    "IntVectorProperty",
+    "PointerProperty",
+    "StringProperty",
+):
+    setattr(props, _kind, _property(_kind))
+
+
+# ------------------- bpy.app --------------#
+app = _module("bpy.app")
+app.version = (4, 0, 0)
+app.version_string = "4.0.0 (fake)"
+app.background = True
+handlers = app.handlers = _module("bpy.app.handlers")
+for _name in ("depsgraph_update_post", "depsgraph_update_pre", "frame_change_post", "load_post", "load_pre", "save_pre"):
+    setattr(handlers, _name, [])
+
+
+def persistent(function):
+    function._bpy_persistent = True
+    return function
+
+
+handlers.persistent = persistent
+
+
+# ------------------- bpy.utils, bpy.msgbus, bpy.path --------------#
+utils = _module("bpy.utils")
+utils.register_class = lambda cls: None
+utils.unregister_class = lambda cls: None
+utils.escape_identifier = lambda text: text.replace("\\", "\\\\").replace('"', '\\"')
+
+msgbus = _module("bpy.msgbus")
+msgbus.subscribe_rna = lambda **keywords: None
+msgbus.clear_by_owner = lambda owner: None
+
+path = _module("bpy.path")
+path.abspath = lambda filepath, **keywords: filepath
+
+
+# ------------------- data, context, ops --------------#
+class _Unavailable:
+    """Attribute access works, anything that needs Blender raises."""
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, name):
+        return _Unavailable(f"{self._name}.{name}")
+
+    def __call__(self, *args, **keywords):
+        raise RuntimeError(f"{self._name}() needs Blender, this is the fake bpy")
+
+    def __bool__(self):
+        return False
+
+
+data = _Unavailable("bpy.data")
+context = _Unavailable("bpy.context")
+ops = _Unavailable("bpy.ops")
@@ -0,0 +1,152 @@
+"""Stand-in for mathutils backed by NumPy, enough for the add-on's imports and helpers.
+
+Vector and Matrix cover the arithmetic the operators use, not the full API.
+"""
+
+import math
+
+import numpy as np
+
+from . import kdtree  # noqa: F401
+
+
+class Vector:
+    __slots__ = ("_v",)
+
+    def __init__(self, values=(0.0, 0.0, 0.0)):
+        self._v = np.array(values, dtype=np.float64).ravel()
+
+    # ---- sequence
+    def __len__(self):
+        return len(self._v)
+
+    def __iter__(self):
+        return iter(self._v.tolist())
+
+    def __getitem__(self, i):
+        return float(self._v[i])
+
+    def __setitem__(self, i, value):
+        self._v[i] = value
+
+    def __array__(self, dtype=None, copy=None):
+        return self._v.astype(dtype) if dtype else self._v.copy()
+
+    def __repr__(self):
+        return f"Vector({tuple(self)})"
+
+    x = property(lambda self: self[0], lambda self, value: self.__setitem__(0, value))
+    y = property(lambda self: self[1], lambda self, value: self.__setitem__(1, value))
+    z = property(lambda self: self[2], lambda self, value: self.__setitem__(2, value))
+
+    # ---- arithmetic
+    def __add__(self, other):
+        return Vector(self._v + np.asarray(other, dtype=np.float64))
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return Vector(self._v - np.asarray(other, dtype=np.float64))
+
+    def __rsub__(self, other):
+        return Vector(np.asarray(other, dtype=np.float64) - self._v)
+
+    def __mul__(self, scalar):
+        return Vector(self._v * scalar)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, scalar):
+        return Vector(self._v / scalar)
+
+    def __neg__(self):
+        return Vector(-self._v)
+
+    def __eq__(self, other):
+        return len(self) == len(other) and bool(np.all(self._v == np.asarray(other)))
+
+    __hash__ = None
+
+    def copy(self):
+        return Vector(self._v)
+
+    def dot(self, other):
+        return float(np.dot(self._v, np.asarray(other)))
+
+    def cross(self, other):
+        return Vector(np.cross(self._v, np.asarray(other)))
+
+    @property
+    def length(self):
+        return float(np.linalg.norm(self._v))
+
+    @property
+    def length_squared(self):
+        return float(np.dot(self._v, self._v))
+
+    def normalized(self):
+        length = self.length
+        return Vector(self._v / length if length else self._v)
+
+    def normalize(self):
+        length = self.length
+        if length:
+            self._v /= length
+
+    def angle(self, other, fallback=None):
+        lengths = self.length * Vector(other).length
+        if not lengths:
+            if fallback is not None:
+                return fallback
+            raise ValueError("Vector.angle(other): zero length vectors have no valid angle")
+        return math.acos(max(-1.0, min(1.0, self.dot(other) / lengths)))
+
+
+class Matrix:
+    __slots__ = ("_m",)
+
+    def __init__(self, rows=None):
+        self._m = np.identity(4) if rows is None else np.array([list(r) for r in rows], dtype=np.float64)
+
+    @classmethod
+    def Identity(cls, size):
+        return cls(np.identity(size))
+
+    @classmethod
+    def Translation(cls, vector):
+        m = np.identity(4)
+        m[:3, 3] = list(vector)[:3]
+        return cls(m)
+
+    def __iter__(self):
+        return (Vector(row) for row in self._m)
+
+    def __getitem__(self, i):
+        return Vector(self._m[i])
+
+    def __len__(self):
+        return len(self._m)
+
+    def __array__(self, dtype=None, copy=None):
+        return self._m.astype(dtype) if dtype else self._m.copy()
+
+    def __repr__(self):
+        return f"Matrix({self._m.tolist()})"
+
+    def __matmul__(self, other):
+        if isinstance(other, Matrix):
+            return Matrix(self._m @ other._m)
+        v = np.asarray(other, dtype=np.float64)
+        if len(v) == 3 and len(self._m) == 4:
+            return Vector((self._m @ np.append(v, 1.0))[:3])
+        return Vector(self._m @ v)
+
+    def copy(self):
+        return Matrix(self._m)
+
+    def inverted(self):
+        return Matrix(np.linalg.inv(self._m))
+
+    @property
+    def translation(self):
+        return Vector(self._m[:3, 3])
@@ -0,0 +1,40 @@
+import numpy as np
+
+
+class KDTree:
+    """Brute force stand-in for mathutils.kdtree.KDTree with the same query results."""
+
+    def __init__(self, size):
+        self._points = np.zeros((size, 3), dtype=np.float64)
+        self._index = np.full(size, -1, dtype=np.int64)
+        self._count = 0
+
+    def insert(self, co, index):
+        self._points[self._count] = co
+        self._index[self._count] = index
+        self._count += 1
+
+    def balance(self):
+        self._points = self._points[: self._count]
+        self._index = self._index[: self._count]
+
+    def _distances(self, co):
+        return np.linalg.norm(self._points - np.asarray(co, dtype=np.float64), axis=1)
+
+    def find(self, co):
+        if not len(self._points):
+            return None, None, None
+        distances = self._distances(co)
+        i = int(np.argmin(distances))
+        return tuple(self._points[i]), int(self._index[i]), float(distances[i])
+
+    def find_n(self, co, n):
+        distances = self._distances(co)
+        order = np.argsort(distances, kind="stable")[:n]
+        return [(tuple(self._points[i]), int(self._index[i]), float(distances[i])) for i in order]
+
+    def find_range(self, co, radius):
+        distances = self._distances(co)
+        found = np.flatnonzero(distances <= radius)
+        found = found[np.argsort(distances[found], kind="stable")]
+        return [(tuple(self._points[i]), int(self._index[i]), float(distances[i])) for i in found]
@@ -0,0 +1,127 @@
+import math
+
+import bpy
+import numpy as np
+
+
+# ------------------- synthetic humanoid --------------#
+# Procedural test subjects for the benchmarks
+# The body is built from elliptic tubes in units of tall (1/57 of the height), in
+# the pose the add-on expects: Z up, facing -Y, feet on the ground, arms along X
+HEIGHT = 1.8
+WIDTH = 29  # half arm span in tall units
+
+# (name, start, end, start radii, end radii, cross section axes, mirrored)
+PARTS = [
+    ("torso", (0, 0, 27), (0, 0, 49), (5.5, 3.2), (5.5, 3), ("X", "Y"), False),
+    ("neck", (0, 0, 49), (0, 0, 52), (1.5, 1.5), (1.5, 1.5), ("X", "Y"), False),
+    ("head", (0, 0, 52), (0, 0, 57), (3, 3.2), (3, 3.2), ("X", "Y"), False),
+    ("leg", (2.5, 0, 30), (2.5, 0, 2), (3, 3), (1.4, 1.4), ("X", "Y"), True),
+    ("foot", (2.5, 1, 1), (2.5, -5, 1), (1.5, 1), (1.2, 0.8), ("X", "Z"), True),
+    ("arm", (4.5, 0, 47), (26, 0, 47), (1.8, 1.8), (1, 1), ("Y", "Z"), True),
+    ("hand", (26, 0, 47), (WIDTH, 0, 47), (1.2, 0.5), (0.9, 0.4), ("Y", "Z"), True),
+]
+AXES = {"X": (1, 0, 0), "Y": (0, 1, 0), "Z": (0, 0, 1)}
+
+# Rigify style deform bones of the left side, the right side is mirrored
+# (name, head, tail, parent, connected)
+SPINE_Z = [28, 31, 34.5, 40, 44.5, 48, 50, 57]
+BONES = [(f"spine.{i:03d}" if i else "spine", (0, 0, SPINE_Z[i]), (0, 0, SPINE_Z[i + 1]), f"spine.{i - 1:03d}" if i > 1 else ("spine" if i else None), True) for i in range(7)]
+SIDE_BONES = [
+    ("shoulder", (1, -0.5, 47.5), (4.5, 0, 48), "spine.003", False),
+    ("upper_arm", (4.5, 0, 47), (15, 0.3, 47), "shoulder", False),
+    ("forearm", (15, 0.3, 47), (26, 0, 47), "upper_arm", True),
+    ("hand", (26, 0, 47), (WIDTH, 0, 47), "forearm", True),
+    ("thigh", (2.5, 0, 30), (2.5, -0.4, 16), "spine", False),
+    ("shin", (2.5, -0.4, 16), (2.5, 0, 3), "thigh", True),
+    ("foot", (2.5, 0, 3), (2.5, -4, 1), "shin", True),
+    ("toe", (2.5, -4, 1), (2.5, -5.5, 1), "foot", True),
+]
+
+
+def tube(start, end, r0, r1, axes, rings, segments):
+    """Vertices (rings * segments, 3) and quad corners (M, 4) of an open elliptic tube."""
+    start, end = np.asarray(start, dtype=np.float64), np.asarray(end, dtype=np.float64)
+    u, v = np.asarray(AXES[axes[0]], dtype=np.float64), np.asarray(AXES[axes[1]], dtype=np.float64)
+    t = np.linspace(0, 1, rings)[:, None]
+    angle = np.linspace(0, 2 * math.pi, segments, endpoint=False)[None, :]
+    ru = (r0[0] + (r1[0] - r0[0]) * t) * np.cos(angle)
+    rv = (r0[1] + (r1[1] - r0[1]) * t) * np.sin(angle)
+    centres = start + (end - start) * t
+    co = centres[:, None, :] + ru[..., None] * u + rv[..., None] * v
+    ring = np.arange(rings - 1)[:, None] * segments
+    seg = np.arange(segments)[None, :]
+    nxt = (seg + 1) % segments
+    quads = np.stack((ring + seg, ring + nxt, ring + segments + nxt, ring + segments + seg), axis=-1)
+    return co.reshape(-1, 3), quads.reshape(-1, 4)
+
+
+def humanoid_parts(vertex_count):
+    """World space (co, quads) of the humanoid, close to vertex_count vertices."""
+    tall = HEIGHT / 57
+    parts = []
+    for name, start, end, r0, r1, axes, mirrored in PARTS:
+        for side in (1, -1) if mirrored else (1,):
+            flip = np.array((side, 1, 1))
+            parts.append((np.array(start) * flip, np.array(end) * flip, r0, r1, axes))
+    areas = [np.linalg.norm(np.subtract(end, start)) * (sum(r0) + sum(r1)) for start, end, r0, r1, _ in parts]
+    total = sum(areas)
+    co, quads, offset = [], [], 0
+    for (start, end, r0, r1, axes), area in zip(parts, areas):
+        count = vertex_count * area / total
+        length = np.linalg.norm(np.subtract(end, start))
+        segments = max(8, int(round(math.sqrt(count * math.pi * (sum(r0) + sum(r1)) / 2 / length))))
+        rings = max(2, int(round(count / segments)))
+        c, q = tube(start * tall, end * tall, np.multiply(r0, tall), np.multiply(r1, tall), axes, rings, segments)
+        co.append(c)
+        quads.append(q + offset)
+        offset += len(c)
+    return np.concatenate(co).astype(np.float32), np.concatenate(quads).astype(np.int32)
+
+
+def build_humanoid(vertex_count, name="bench_human"):
+    """Mesh object of a synthetic humanoid linked to the scene, built with bulk foreach_set."""
+    co, quads = humanoid_parts(vertex_count)
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add(len(co))
+    mesh.vertices.foreach_set("co", co.ravel())
+    mesh.loops.add(quads.size)
+    mesh.loops.foreach_set("vertex_index", quads.ravel())
+    mesh.polygons.add(len(quads))
+    mesh.polygons.foreach_set("loop_start", np.arange(0, quads.size, 4, dtype=np.int32))
+    mesh.update(calc_edges=True)
+    obj = bpy.data.objects.new(name, mesh)
+    bpy.context.scene.collection.objects.link(obj)
+    return obj
+
+
+def build_armature(name="bench_rig"):
+    """Armature object with the Rigify style bone set, in T pose over the humanoid."""
+    tall = HEIGHT / 57
+    data = bpy.data.armatures.new(name)
+    obj = bpy.data.objects.new(name, data)
+    bpy.context.scene.collection.objects.link(obj)
+    view_layer = bpy.context.view_layer
+    for other in view_layer.objects:
+        other.select_set(False)
+    view_layer.objects.active = obj
+    obj.select_set(True)
+
+    bpy.ops.object.mode_set(mode="EDIT")
+    bones = list(BONES)
+    for side, suffix in ((1, ".L"), (-1, ".R")):
+        for bname, head, tail, parent, connected in SIDE_BONES:
+            parent = parent if parent.startswith("spine") else parent + suffix
+            bones.append((bname + suffix, (head[0] * side, head[1], head[2]), (tail[0] * side, tail[1], tail[2]), parent, connected))
+    edit_bones = data.edit_bones
+    for bname, head, tail, parent, connected in bones:
+        bone = edit_bones.new(bname)
+        bone.head = [c * tall for c in head]
+        bone.tail = [c * tall for c in tail]
+        bone.use_deform = True
+        if parent:
+            bone.parent = edit_bones[parent]
+            bone.use_connect = connected
+        bone.envelope_distance = bone.length / 4
+    bpy.ops.object.mode_set(mode="OBJECT")
+    return obj
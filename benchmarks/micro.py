@@ -0,0 +1,118 @@
+"""Microbenchmarks of the numeric core under plain CPython.
+
+    python benchmarks/micro.py --sizes 10k,100k,1m --out micro.json
+
+The add-on is imported against the stand-in bpy and mathutils in benchmarks/fakebpy,
+so this runs in seconds without Blender. The JSON has the layout of run.py results
+and can be compared with benchmarks/compare.py.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(HERE, "fakebpy"), HERE]
+
+import numpy as np  # noqa: E402
+from addon import PACKAGE, commit, load_addon, parse_size  # noqa: E402
+from humanoid import BONES, HEIGHT, SIDE_BONES, humanoid_parts  # noqa: E402
+
+PROXY_BUDGETS = (50000, 10000)
+
+
+def deform_segments():
+    """Heads and tails (B, 3) of the synthetic armature's deform bones, in metres."""
+    tall = HEIGHT / 57
+    heads, tails = [], []
+    for _, head, tail, _, _ in BONES:
+        heads.append(head)
+        tails.append(tail)
+    for side in (1, -1):
+        for _, head, tail, _, _ in SIDE_BONES:
+            heads.append((head[0] * side, head[1], head[2]))
+            tails.append((tail[0] * side, tail[1], tail[2]))
+    return np.array(heads, dtype=np.float32) * tall, np.array(tails, dtype=np.float32) * tall
+
+
+def measure(function, repeat):
+    """Median wall time of function in ms and its last result."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append((time.perf_counter() - start) * 1000)
+    return {"runs_ms": [round(t, 3) for t in times], "median_ms": round(statistics.median(times), 3)}, result
+
+
+def bench_size(core, vertex_count, repeat):
+    co, _ = humanoid_parts(vertex_count)
+    tall = float(co[:, 2].max() - co[:, 2].min()) / 57
+    width = float(co[:, 0].max() - co[:, 0].min()) / 2
+    heads, tails = deform_segments()
+    results = {}
+
+    def run(label, function, times=repeat):
+        results[label], result = measure(function, times)
+        print(f"  {label:<28} {results[label]['median_ms']:>10.1f} ms")
+        return result
+
+    index = run("spatial_index", lambda: core.spatial.SpatialIndex(co, tall))
+    marks = run("find_landmarks", lambda: core.landmarks.find_landmarks(index, tall, width))
+    run("symmetry", lambda: core.landmarks.symmetry(co, tall / 2))
+    run("find_landmarks[auto]", lambda: core.landmarks.find_landmarks(index, tall, width, "AUTO"))
+    run("find_landmarks[both]", lambda: core.landmarks.find_landmarks(index, tall, width, "BOTH"))
+    run("rig_layout", lambda: core.landmarks.rig_layout(marks))
+    run("body_frame", lambda: core.orientation.body_frame(co))
+    for budget in PROXY_BUDGETS:
+        proxy, _ = run(f"proxy_points[{budget}]", lambda: core.proxy.proxy_points(co, budget))
+        fitted = run(f"find_landmarks[proxy {budget}]", lambda: core.landmarks.find_landmarks(core.spatial.SpatialIndex(proxy, tall), tall, width))
+        results[f"find_landmarks[proxy {budget}]"]["max_joint_shift"] = max(core.landmarks.joint_deviation(fitted, marks).values())
+    run("min_segment_distance", lambda: core.capsule.min_segment_distance(co, heads, tails))
+    falloffs = np.linalg.norm(tails - heads, axis=1) / 4
+    rows, cols, weights = run("falloff_weights", lambda: core.capsule.falloff_weights(co, heads, tails, falloffs))
+    run("clean_weights", lambda: core.weights.clean_weights(rows, cols, weights))
+    run("point_segment_distance", lambda: core.geometry.point_segment_distance(co, heads[0], tails[0]))
+    poles = [(heads[i], tails[i], (1, 0, 0), tails[i + 1], heads[i] + (0, -0.3, 0)) for i in range(len(heads) - 1)]
+    run("pole_angle x100", lambda: [core.geometry.pole_angle(*pole) for _ in range(100 // len(poles) + 1) for pole in poles])
+    return {"vertices": len(co), "operators": results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10k,100k,1m", help="comma separated vertex counts, k and m suffixes allowed")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per function, the median is reported")
+    parser.add_argument("--out", default="fg_micro.json")
+    args = parser.parse_args(argv)
+
+    addon = load_addon()
+    core = sys.modules[PACKAGE + ".core"]
+    for name in ("capsule", "geometry", "landmarks", "orientation", "proxy", "spatial", "weights"):
+        __import__(f"{PACKAGE}.core.{name}")
+    report = {
+        "commit": commit(),
+        "blender": None,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "repeat": args.repeat,
+        "sizes": {},
+    }
+    try:
+        for size in [parse_size(s) for s in args.sizes.split(",") if s.strip()]:
+            print(f"--- {size} ---")
+            report["sizes"][str(size)] = bench_size(core, size, args.repeat)
+    finally:
+        addon.unregister()
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"written {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Headless benchmarks of the FG Rig Tools operators.
+
+    blender --background --factory-startup --python benchmarks/run.py -- --sizes 10k,100k,500k,2m --out bench.json
+
+Every size gets a fresh scene with a synthetic humanoid and a Rigify style armature,
+each operator is run --repeat times and its wall time and @timed phases are kept.
+Compare two result files with benchmarks/compare.py.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import bpy
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from addon import PACKAGE, activate, commit, load_addon, parse_size, select_bones, view3d_override  # noqa: E402
+from humanoid import build_armature, build_humanoid  # noqa: E402
+
+
+# ------------------- timing --------------#
+class Bench:
+    def __init__(self, perf, repeat):
+        self.perf = perf
+        self.repeat = repeat
+        self.override = view3d_override()
+        self.results = {}
+
+    def run(self, label, idname, setup=None, repeat=None, **props):
+        """Run bpy.ops.<idname> repeat times after setup, record wall and phase times in ms."""
+        category, name = idname.split(".")
+        op = getattr(getattr(bpy.ops, category), name)
+        walls, phases, error = [], {}, ""
+        for _ in range(repeat or self.repeat):
+            if setup:
+                setup()
+            self.perf.stats.clear()
+            start = time.perf_counter()
+            try:
+                with bpy.context.temp_override(**self.override):
+                    result = op(**props)
+            except RuntimeError as e:
+                error = str(e).strip()
+                break
+            walls.append((time.perf_counter() - start) * 1000)
+            if "FINISHED" not in result:
+                error = f"returned {sorted(result)}"
+                break
+            stats = self.perf.as_dict().get(idname, {})
+            for phase, timing in stats.get("phases", {}).items():
+                phases.setdefault(phase, []).append(timing["last"] * 1000)
+        entry = {"runs_ms": [round(w, 3) for w in walls]}
+        if walls:
+            entry["median_ms"] = round(statistics.median(walls), 3)
+            entry["phases_ms"] = {phase: round(statistics.median(times), 3) for phase, times in phases.items()}
+        if error:
+            entry["error"] = error
+        self.results[label] = entry
+        print(f"  {label:<28} {entry.get('median_ms', float('nan')):>10.1f} ms {error}")
+        return entry
+
+
+def bench_size(perf, vertex_count, args):
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    scene = bpy.context.scene
+    human = build_humanoid(vertex_count)
+    armature = build_armature()
+    scene.my_object = human
+    scene.my_armature = armature
+    scene.frame_start, scene.frame_end = 1, args.frames
+    bench = Bench(perf, args.repeat)
+    print(f"{len(human.data.vertices)} vertices")
+
+    def rig_setup():
+        activate(armature)
+
+    bench.run("generate_rig", "fg.generate_rig", rig_setup, use_cache=False)
+    bench.run("generate_rig[cached]", "fg.generate_rig", rig_setup, use_cache=True)
+
+    def wpaint_setup():
+        activate(armature)
+        select_bones(armature, {"upper_arm.L", "forearm.L", "thigh.L", "shin.L"})
+
+    bench.run("wpaintauto", "fg.wpaintauto", wpaint_setup)
+    bench.run("autoparent[distance]", "fg.autoparent", lambda: activate(human), method="DISTANCE")
+    if vertex_count <= args.heat_max:
+        bench.run("autoparent[heat]", "fg.autoparent", lambda: activate(human), repeat=1, method="HEAT")
+    bench.run("clean_weights", "fg.clean_weights", lambda: activate(human))
+
+    for limb in ("shin.L", "forearm.L", "shin.R", "forearm.R"):
+        bench.run(f"generate_ik[{limb}]", "fg.generate_ik", lambda limb=limb: (activate(armature), select_bones(armature, {limb}, limb)))
+
+    def upper_setup():
+        activate(armature)
+        select_bones(armature, {"upper_arm.L"}, "upper_arm.L")
+
+    bench.run("twist_upper", "fg.up_twist_armleg", upper_setup)
+    # the lower generator reads its hand bone from the panel enum, the batch
+    # operator resolves it from the bone at the forearm tail instead
+    bench.run("twist_lower", "fg.twist_limbs", lambda: activate(armature), up_limbs="", down_limbs="forearm.L")
+    for style in ("FULL", "LIGHT"):
+        bench.run(f"twist_limbs[{style.lower()}]", "fg.twist_limbs", lambda: activate(armature), style=style)
+
+    def snap_setup():
+        activate(armature, "POSE")
+        select_bones(armature, {"shin.L"}, "shin.L")
+
+    bench.run("ikfksnap[current]", "fg.ikorfksnap", snap_setup, scope="ALL", bake="CURRENT")
+    bench.run("ikfksnap[range]", "fg.ikorfksnap", snap_setup, scope="ALL", bake="RANGE", use_scene_range=True)
+
+    if args.crowd:
+        crowd = bpy.data.collections.new("bench_crowd")
+        scene.collection.children.link(crowd)
+        for i in range(args.crowd):
+            copy = human.copy()
+            copy.data = human.data.copy()
+            copy.parent = None
+            copy.modifiers.clear()
+            copy.location = (2.0 * (i + 1), 0, 0)
+            crowd.objects.link(copy)
+        scene.fg_batch_collection = crowd
+        bench.run(f"batch_generate_rig[{args.crowd}]", "fg.batch_generate_rig", lambda: activate(armature), repeat=1, use_cache=False)
+    return {"vertices": len(human.data.vertices), "operators": bench.results}
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="run.py", description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10k,100k,500k,2m", help="comma separated vertex counts, k and m suffixes allowed")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per operator, the median is reported")
+    parser.add_argument("--frames", type=int, default=50, help="frame range of the IK/FK bake")
+    parser.add_argument("--heat-max", type=parse_size, default=parse_size("50k"), help="largest mesh the bone heat autoparent runs on")
+    parser.add_argument("--crowd", type=int, default=0, help="also rig a collection of this many copies with the batch operator")
+    parser.add_argument("--out", default="fg_bench.json")
+    args = parser.parse_args(argv)
+
+    addon = load_addon()
+    perf = sys.modules[PACKAGE + ".operators.perf"]
+    report = {
+        "commit": commit(),
+        "blender": bpy.app.version_string,
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "repeat": args.repeat,
+        "sizes": {},
+    }
+    try:
+        for size in [parse_size(s) for s in args.sizes.split(",") if s.strip()]:
+            print(f"--- {size} ---")
+            report["sizes"][str(size)] = bench_size(perf, size, args)
+    finally:
+        addon.unregister()
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"written {args.out}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[sys.argv.index("--") + 1 :] if "--" in sys.argv else [])
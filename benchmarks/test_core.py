@@ -0,0 +1,198 @@
+"""Checks of the numeric core against plain reference versions, under plain CPython.
+
+    python -m pytest benchmarks -q
+
+Like micro.py the add-on is imported against the stand-in bpy and mathutils in
+benchmarks/fakebpy. Every check compares a fast path with the straightforward
+computation it replaced, on the synthetic humanoid or on random points.
+"""
+
+import math
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(HERE, "fakebpy"), HERE]
+
+import numpy as np  # noqa: E402
+from addon import PACKAGE, load_addon  # noqa: E402
+from humanoid import humanoid_parts  # noqa: E402
+from mathutils import Vector  # noqa: E402
+
+load_addon(register=False)
+for _name in ("capsule", "geometry", "landmarks", "orientation", "proxy", "spatial", "weights"):
+    __import__(f"{PACKAGE}.core.{_name}")
+core = sys.modules[PACKAGE + ".core"]
+
+VERTICES = 100000
+_humanoid = []
+
+
+def humanoid():
+    """(points, tall, width) of the synthetic humanoid, built once."""
+    if not _humanoid:
+        co, _ = humanoid_parts(VERTICES)
+        _humanoid.extend((co, float(np.ptp(co[:, 2])) / 57, float(np.ptp(co[:, 0])) / 2))
+    return _humanoid
+
+
+class BruteIndex:
+    """SpatialIndex interface answered by scanning every point, the reference for the grid."""
+
+    def __init__(self, points):
+        self.points = points
+
+    def box(self, xmin=None, xmax=None, zmin=None, zmax=None):
+        x, z = self.points[:, 0], self.points[:, 2]
+        mask = np.ones(len(self.points), dtype=bool)
+        for bound, values, inside in ((xmin, x, np.greater), (xmax, x, np.less), (zmin, z, np.greater), (zmax, z, np.less)):
+            if bound is not None:
+                mask &= inside(values, bound)
+        return np.flatnonzero(mask)
+
+    def take(self, idx):
+        return self.points[idx]
+
+
+# ------------------- geometry --------------#
+def mathutils_pole_angle(base, middle, pole):
+    """The add-on's original get_pole_angle, on mathutils vectors."""
+
+    def get_signed_angle(vector_u, vector_v, normal):
+        uv_angle = vector_u.angle(vector_v)
+        if vector_u.cross(vector_v) == Vector((0, 0, 0)):
+            return uv_angle
+        if vector_u.cross(vector_v).angle(normal) < 1:
+            return -uv_angle
+        return uv_angle
+
+    pole_normal = (middle.tail - base.head).cross(pole.head - base.head)
+    projected_pole_axis = pole_normal.cross(base.tail - base.head)
+    return get_signed_angle(base.x_axis, projected_pole_axis, base.tail - base.head)
+
+
+def test_pole_angle_matches_mathutils():
+    rng = np.random.default_rng(1)
+
+    class Bone:
+        def __init__(self, head, tail, x_axis=(1, 0, 0)):
+            self.head, self.tail, self.x_axis = Vector(head), Vector(tail), Vector(x_axis)
+
+    for _ in range(200):
+        head, tail, end, pole = rng.normal(size=(4, 3))
+        x_axis = np.cross(tail - head, rng.normal(size=3))
+        base, middle, target = Bone(head, tail, x_axis), Bone(tail, end), Bone(pole, pole + 1)
+        expected = mathutils_pole_angle(base, middle, target)
+        assert math.isclose(core.geometry.pole_angle(head, tail, x_axis, end, pole), expected, abs_tol=1e-6)
+
+
+def test_point_segment_distance_matches_projection():
+    rng = np.random.default_rng(2)
+    points = rng.normal(size=(500, 3)).astype(np.float32)
+    start, end = np.array((0, 0, 0), dtype=np.float32), np.array((1, 0.5, 0), dtype=np.float32)
+    t = np.clip((points - start) @ (end - start) / ((end - start) @ (end - start)), 0, 1)
+    expected = np.linalg.norm(points - (start + t[:, None] * (end - start)), axis=1)
+    assert np.allclose(core.geometry.point_segment_distance(points, start, end), expected, atol=1e-5)
+
+
+# ------------------- spatial queries --------------#
+def test_spatial_index_box_matches_scan():
+    points, tall, width = humanoid()
+    index = core.spatial.SpatialIndex(points, tall)
+    brute = BruteIndex(points)
+    for bounds in ((None, None, 0, tall * 2), (tall * 3.5, None, None, None), (-0.1, 0.1, None, None), (width - tall, width + tall, tall * 40, None)):
+        assert np.array_equal(np.sort(index.box(*bounds)), brute.box(*bounds))
+
+
+def test_capsule_hits_match_brute_force():
+    points, tall, _ = humanoid()
+    index = core.spatial.SpatialIndex(points, 0)
+    rng = np.random.default_rng(3)
+    low, high = points.min(axis=0), points.max(axis=0)
+    for radius in (0.005, 0.03, 0.1):
+        for head, tail in rng.uniform(low, high, size=(10, 2, 3)).astype(np.float32):
+            distances = core.capsule.segment_distance_matrix(points, head[None], tail[None])[:, 0]
+            assert np.array_equal(core.capsule.capsule_hits(index, points, head, tail, radius), np.flatnonzero(distances <= radius))
+
+
+# ------------------- landmarks --------------#
+# Axis each limb landmark is the extreme along. Flat faces of the synthetic body tie
+# on that axis, where two searches may pick different points of the same face
+SEARCHED_AXIS = {"armpit": 2, "hand": 0, "elbow": 1, "wrist": 1, "knee": 1, "ankle": 1, "toe": 1}
+
+
+def assert_same_extremes(marks, reference):
+    assert np.allclose(marks["spine_y"], reference["spine_y"], atol=1e-6)
+    for side in ("L", "R"):
+        limbs, expected = core.landmarks.side_limbs(marks, side), core.landmarks.side_limbs(reference, side)
+        for name, axis in SEARCHED_AXIS.items():
+            assert math.isclose(limbs[name][axis], expected[name][axis], abs_tol=1e-6), f"{name}.{side}"
+
+
+def test_coarse_to_fine_landmarks_match_full_scan(monkeypatch):
+    points, tall, width = humanoid()
+    fast = core.landmarks.find_landmarks(core.spatial.SpatialIndex(points, tall), tall, width, "BOTH")
+    # one level over every point: the plain argmax over each box, as the add-on first did
+    monkeypatch.setattr(core.landmarks, "search_levels", lambda index, tall: [(BruteIndex(points), None)])
+    reference = core.landmarks.find_landmarks(BruteIndex(points), tall, width, "BOTH")
+    assert_same_extremes(fast, reference)
+
+
+def test_mirrored_landmarks_match_fitted_right_side():
+    points, tall, width = humanoid()
+    index = core.spatial.SpatialIndex(points, tall)
+    mirrored = core.landmarks.find_landmarks(index, tall, width, "AUTO")
+    assert mirrored["mirror"] == "SYMMETRIC"
+    assert_same_extremes(mirrored, core.landmarks.find_landmarks(index, tall, width, "BOTH"))
+
+
+def test_proxy_fits_budget():
+    points, tall, width = humanoid()
+    assert core.proxy.proxy_points(points, 0)[1] == 0.0
+    assert core.proxy.proxy_points(points, len(points))[0] is points
+    low, high = core.proxy.bounds(points)
+    for budget in (50000, 10000, 2000):
+        proxy, voxel = core.proxy.proxy_points(points, budget)
+        assert 0 < len(proxy) <= budget and voxel > 0
+        assert np.all(proxy >= low.astype(np.float32) - 1e-5) and np.all(proxy <= high.astype(np.float32) + 1e-5)
+        # every proxy point is a voxel centroid, so it lies within a voxel diagonal of a vertex
+        for centroid in proxy[:: max(len(proxy) // 50, 1)]:
+            assert np.linalg.norm(points - centroid, axis=1).min() <= voxel * math.sqrt(3)
+
+
+def test_body_frame_undoes_a_rotation():
+    points, tall, width = humanoid()
+    upright = core.orientation.to_frame(points, core.orientation.body_frame(points))
+    # lying on its back with the head along +y, then turned about z and moved
+    turn = np.array([[1, 0, 0], [0, 0, -1], [0, 1, 0]], dtype=np.float64)
+    angle = 0.7
+    spin = np.array([[math.cos(angle), -math.sin(angle), 0], [math.sin(angle), math.cos(angle), 0], [0, 0, 1]])
+    moved = (points @ (spin @ turn).T + (3, -2, 0.5)).astype(np.float32)
+    found = core.orientation.to_frame(moved, core.orientation.body_frame(moved))
+    # the upright frame is snapped to the world axes, the turned one keeps the small
+    # tilt the toes and the nose give the principal axes
+    assert np.abs(found - upright).max() < tall / 2
+
+
+# ------------------- weights --------------#
+def test_clean_weights_limits_and_normalizes_to_targets():
+    rng = np.random.default_rng(4)
+    vertices, groups = 300, 8
+    rows = np.repeat(np.arange(vertices), groups)
+    cols = np.tile(np.arange(groups), vertices)
+    weights = rng.random(len(rows)).astype(np.float32)
+    targets = rng.uniform(0.2, 1, vertices)
+    keep, cleaned = core.weights.clean_weights(rows, cols, weights, limit=3, threshold=0.05, targets=targets)
+    assert np.bincount(rows[keep], minlength=vertices).max() <= 3
+    assert np.allclose(np.bincount(rows[keep], cleaned[keep], minlength=vertices), targets, atol=1e-5)
+    assert not cleaned[~keep].any()
+    # the kept entries are each vertex's strongest ones
+    for v in range(0, vertices, 37):
+        mine = rows == v
+        assert set(cols[mine & keep]) <= set(cols[mine][np.argsort(-weights[mine])[:3]])
+
+
+if __name__ == "__main__":
+    import pytest
+
+    sys.exit(pytest.main([__file__, "-q"]))
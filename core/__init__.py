@@ -0,0 +1,3 @@
+# ------------------- numeric core --------------#
+# Plain NumPy code shared by the operators: no bpy, no mathutils, arrays in and
+# arrays out, so it can be profiled and benchmarked under plain CPython
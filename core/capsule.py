@@ -0,0 +1,93 @@
+import numpy as np
+
+
+# ------------------- capsule distances --------------#
+# Batched point to segment distances for bone capsules
+# Bones are segments from head to tail, all of them are tested against a chunk
+# of points at once so the (points x bones) work stays inside a memory budget
+CHUNK_ELEMENTS = 1 << 22
+
+
+def segment_distance_matrix(points, heads, tails):
+    """Distances from every point (N, 3) to every segment (B, 3) -> (N, B) float32."""
+    vectors = tails - heads
+    length_squared = np.einsum("ij,ij->i", vectors, vectors)
+    safe = np.where(length_squared > 0, length_squared, 1)
+    offsets = points[:, None, :] - heads[None, :, :]
+    t = np.einsum("nbj,bj->nb", offsets, vectors) / safe
+    np.clip(t, 0, 1, out=t)
+    t[:, length_squared == 0] = 0
+    offsets -= t[:, :, None] * vectors[None, :, :]
+    return np.sqrt(np.einsum("nbj,nbj->nb", offsets, offsets)).astype(np.float32)
+
+
+def iter_segment_distances(points, heads, tails, chunk_elements=CHUNK_ELEMENTS):
+    """Yield (start, distances) for consecutive point chunks, distances is (chunk, B)."""
+    heads = np.asarray(heads, dtype=np.float32).reshape(-1, 3)
+    tails = np.asarray(tails, dtype=np.float32).reshape(-1, 3)
+    step = max(chunk_elements // max(len(heads), 1), 1)
+    for start in range(0, len(points), step):
+        yield start, segment_distance_matrix(points[start : start + step], heads, tails)
+
+
+def min_segment_distance(points, heads, tails, chunk_elements=CHUNK_ELEMENTS):
+    """Distance from every point to its nearest segment -> (N,) float32."""
+    result = np.full(len(points), np.inf, dtype=np.float32)
+    if not len(heads):
+        return result
+    for start, distances in iter_segment_distances(points, heads, tails, chunk_elements):
+        result[start : start + len(distances)] = distances.min(axis=1)
+    return result
+
+
+def capsule_candidates(index, head, tail, radius):
+    """Indices of the points of a SpatialIndex near the capsule around segment head-tail.
+
+    The segment is sampled with a spacing of at least twice the radius and every sample
+    does one grid box query, so the cost follows the number of vertices returned."""
+    head = np.asarray(head, dtype=np.float64)
+    tail = np.asarray(tail, dtype=np.float64)
+    length = float(np.linalg.norm(tail - head))
+    spacing = max(2 * radius, length / 64, 1e-6)
+    count = int(np.ceil(length / spacing)) + 1
+    reach = radius + spacing / 2
+    found = [np.empty(0, dtype=np.int64)]
+    for t in np.linspace(0, 1, count):
+        x, y, z = head + (tail - head) * t
+        idx = index.near(x, z, reach)
+        found.append(idx[np.abs(index.points[idx, 1] - y) <= reach])
+    return np.unique(np.concatenate(found))
+
+
+def capsule_hits(index, points, head, tail, radius):
+    """Indices of the points within radius of segment head-tail, prefiltered through a SpatialIndex."""
+    idx = capsule_candidates(index, head, tail, radius)
+    if not len(idx):
+        return idx
+    distances = segment_distance_matrix(points[idx], np.asarray(head, dtype=np.float32)[None], np.asarray(tail, dtype=np.float32)[None])
+    return idx[distances[:, 0] <= radius]
+
+
+def falloff_weights(points, heads, tails, falloffs, min_weight=0.01, chunk_elements=CHUNK_ELEMENTS):
+    """Distance falloff weights of every point for every bone capsule.
+
+    The nearest bone always gets full weight and the others fade out with a smoothstep over
+    their own falloff distance, measured past the nearest bone's distance, so every point
+    ends up weighted. Weights are normalized per point and entries below min_weight dropped.
+    Returns (point indices, bone indices, weights) of the non zero entries."""
+    falloffs = np.maximum(np.asarray(falloffs, dtype=np.float32), 1e-6)
+    point_idx, bone_idx, values = [], [], []
+    for start, distances in iter_segment_distances(points, heads, tails, chunk_elements):
+        t = 1 - (distances - distances.min(axis=1, keepdims=True)) / falloffs
+        np.clip(t, 0, 1, out=t)
+        weights = t * t * (3 - 2 * t)
+        weights /= weights.sum(axis=1, keepdims=True)
+        weights[weights < min_weight] = 0
+        weights /= weights.sum(axis=1, keepdims=True)
+        rows, cols = np.nonzero(weights)
+        point_idx.append(rows + start)
+        bone_idx.append(cols)
+        values.append(weights[rows, cols])
+    if not point_idx:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    return np.concatenate(point_idx), np.concatenate(bone_idx), np.concatenate(values)
@@ -0,0 +1,44 @@
+import numpy as np
+
+from .capsule import segment_distance_matrix
+
+
+# ------------------- geometry --------------#
+# Plain array versions of the bone math used by the operators
+# Vectors are anything np.asarray takes, bones are passed as their head, tail and
+# x axis so the functions run without edit bones or mathutils
+def signed_angle(u, v, normal):
+    """Angle between u and v, negative when u x v points along normal (within 1 radian)."""
+    u, v, normal = (np.asarray(a, dtype=np.float64) for a in (u, v, normal))
+    lengths = np.linalg.norm(u) * np.linalg.norm(v)
+    if lengths == 0:
+        raise ValueError("zero length vector has no angle")
+    angle = float(np.arccos(np.clip(np.dot(u, v) / lengths, -1, 1)))
+    cross = np.cross(u, v)
+    if not cross.any():
+        return angle
+    cross_length = np.linalg.norm(cross) * np.linalg.norm(normal)
+    if cross_length and np.arccos(np.clip(np.dot(cross, normal) / cross_length, -1, 1)) < 1:
+        return -angle
+    return angle
+
+
+def pole_angle(base_head, base_tail, base_x_axis, middle_tail, pole_head):
+    """Pole angle of an IK constraint on a two bone chain.
+
+    The angle between the base bone's x axis and the pole direction projected on
+    the plane of the base bone, in radians."""
+    base_head = np.asarray(base_head, dtype=np.float64)
+    base_vector = np.asarray(base_tail, dtype=np.float64) - base_head
+    pole_normal = np.cross(np.asarray(middle_tail) - base_head, np.asarray(pole_head) - base_head)
+    projected_pole_axis = np.cross(pole_normal, base_vector)
+    return signed_angle(base_x_axis, projected_pole_axis, base_vector)
+
+
+def point_segment_distance(points, start, end):
+    """Distance from each point (N, 3), or a single point, to the segment start-end."""
+    points = np.asarray(points, dtype=np.float32)
+    start = np.asarray(start, dtype=np.float32).reshape(1, 3)
+    end = np.asarray(end, dtype=np.float32).reshape(1, 3)
+    distances = segment_distance_matrix(points.reshape(-1, 3), start, end)[:, 0]
+    return float(distances[0]) if points.ndim == 1 else distances
@@ -0,0 +1,232 @@
+import numpy as np
+
+from .spatial import SpatialIndex
+
+
+# ------------------- landmarks --------------#
+# Find the joint landmarks of a humanoid mesh
+# Everything is measured in units of tall (1/57 of the body height), the mesh is
+# expected Z up, facing -Y, feet on the ground and centred on x = 0
+SPINE_BONES = ["spine", "spine.001", "spine.002", "spine.003", "spine.004", "spine.005", "spine.006"]
+SPINE_LENGTHS = [2.5, 3, 6.5, 4.5, 2.5, 1.5, 6]
+SPINE_YPOS = [0.5, 0, -0.3, 0, 1.2, 0.5, 0.08]
+ARM_BONES = ["shoulder.L", "upper_arm.L", "forearm.L", "hand.L"]
+LEG_BONES = ["thigh.L", "shin.L", "foot.L", "toe.L"]
+LIMB_MARKS = ["armpit", "hand", "elbow", "wrist", "knee", "ankle", "toe"]
+# side suffix -> sign of x on that side
+SIDES = {"L": 1, "R": -1}
+
+# Mirror modes: NONE fits the left limbs only, AUTO mirrors the left limbs onto the
+# right when the mesh passes the symmetry test and fits both sides otherwise, BOTH
+# always fits both sides
+MIRROR_MODES = ("NONE", "AUTO", "BOTH")
+SYMMETRY_SAMPLES = 4096
+SYMMETRY_MATCH = 0.9
+
+# Coarse to fine search: every landmark is the extreme point of a box query. It is
+# found on strided samples of the points first (COARSE_LEVELS points, each sample
+# taken from the next finer one), then every finer level only searches a window
+# around the previous estimate that shrinks with the sample spacing, so a joint
+# costs the points near it rather than every point of its box. A level is only
+# used when it thins the points by at least COARSE_STEP
+COARSE_LEVELS = (2048, 16384)
+COARSE_WINDOW = 3
+COARSE_STEP = 8
+
+
+def side_bones(bones, side):
+    """Names of the .L bones for side "L" or "R"."""
+    return [bn[:-2] + "." + side for bn in bones]
+
+
+def symmetry(points, tolerance, samples=SYMMETRY_SAMPLES):
+    """Fraction of a subsample of points whose mirror across x = 0 lies on the mesh.
+
+    Points are hashed on a grid of tolerance, a mirrored sample matches when one
+    of the 27 cells around it holds a point, tested for all samples at once."""
+    if not len(points):
+        return 0.0
+    cell = max(float(tolerance), 1e-6)
+    keys = np.floor(points / cell).astype(np.int64)
+    picks = np.linspace(0, len(points) - 1, min(samples, len(points))).astype(np.int64)
+    around = np.stack(np.meshgrid(*[(-1, 0, 1)] * 3, indexing="ij"), axis=-1).reshape(1, 27, 3)
+    near = np.floor(points[picks] * (-1, 1, 1) / cell).astype(np.int64)[:, None, :] + around
+
+    low = np.minimum(keys.min(axis=0), near.min(axis=(0, 1)))
+    span = np.maximum(keys.max(axis=0), near.max(axis=(0, 1))) - low + 1
+
+    def encode(ijk):
+        ijk = ijk - low
+        return (ijk[..., 0] * span[1] + ijk[..., 1]) * span[2] + ijk[..., 2]
+
+    found = np.isin(encode(near), np.unique(encode(keys))).any(axis=1)
+    return float(found.mean())
+
+
+def search_levels(index, tall, levels=COARSE_LEVELS):
+    """[(index, window)] coarsest first, ending with index itself; window is None on the coarsest."""
+    samples = []
+    points = index.points
+    for count in sorted(levels, reverse=True):
+        step = len(points) // count
+        if step < COARSE_STEP:
+            continue
+        points = points[::step]
+        samples.insert(0, points)
+    found, window = [], None
+    for sample in samples:
+        found.append((SpatialIndex(sample, tall), window))
+        window = COARSE_WINDOW * tall * 57 / np.sqrt(len(sample))
+    found.append((index, window))
+    return found
+
+
+def extreme(levels, axis, sign, xmin=None, xmax=None, zmin=None, zmax=None):
+    """Point inside the box (None means unbounded) with the largest sign * coordinate on axis.
+
+    Searched level by level, inside a window around the estimate of the coarser
+    level once there is one. Returns None when the box holds no point."""
+    best = None
+    for index, window in levels:
+        bounds = (xmin, xmax, zmin, zmax)
+        if best is not None and window is not None:
+            bounds = (
+                _tighter(xmin, best[0] - window, max), _tighter(xmax, best[0] + window, min),
+                _tighter(zmin, best[2] - window, max), _tighter(zmax, best[2] + window, min),
+            )
+        points = index.take(index.box(*bounds))
+        if len(points):
+            best = points[np.argmax(sign * points[:, axis])]
+    return best
+
+
+def _tighter(bound, edge, pick):
+    return edge if bound is None else pick(bound, edge)
+
+
+def find_landmarks(index, tall, width, mirror="NONE"):
+    """Return the landmarks found in a SpatialIndex of the world space vertices as a plain dict.
+
+    The left limb landmarks are stored at the top level. With mirror AUTO or BOTH the
+    dict also has "mirror": "SYMMETRIC" when the right limbs are the mirrored left
+    ones, or "BOTH" with the right limb landmarks measured under "right"."""
+    levels = search_levels(index, tall)
+    uppest = extreme(levels, 2, 1, -0.1, 0.1)
+
+    # ---- spine depth centres
+    spine_z = [float(tall * 30.5)]
+    for length in SPINE_LENGTHS:
+        spine_z.append(float(spine_z[-1] + length * tall))
+    spine_y = []
+    for i, z in enumerate(spine_z[:-1]):
+        bounds = (max(-tall / 2, -0.1), min(tall / 2, 0.1), z - tall / 2, z + tall / 2)
+        front, back = extreme(levels, 1, 1, *bounds), extreme(levels, 1, -1, *bounds)
+        if front is None:
+            spine_y.append(SPINE_YPOS[i] * tall + float(uppest[1]))
+        else:
+            spine_y.append(float(front[1] * 0.55 + back[1] * 0.45))
+
+    marks = {"tall": float(tall), "width": float(width), "spine_z": spine_z, "spine_y": spine_y}
+    marks.update(limb_landmarks(levels, tall, width, "L"))
+    if mirror == "AUTO" and symmetry(index.points, tall / 2) >= SYMMETRY_MATCH:
+        marks["mirror"] = "SYMMETRIC"
+    elif mirror in ("AUTO", "BOTH"):
+        marks["mirror"] = "BOTH"
+        marks["right"] = limb_landmarks(levels, tall, width, "R")
+    return marks
+
+
+def limb_landmarks(levels, tall, width, side):
+    """Arm and leg landmarks of one side, found with x mirrored queries on the shared search levels."""
+    sign = SIDES[side]
+
+    def xextreme(name, axis, direction, xmin=None, xmax=None, zmin=None, zmax=None):
+        # x bounds are given for the left side
+        if sign < 0:
+            xmin, xmax = (None if xmax is None else -xmax), (None if xmin is None else -xmin)
+        point = extreme(levels, axis, direction, xmin, xmax, zmin, zmax)
+        if point is None:
+            raise ValueError(f"No vertices around the {name}.{side}")
+        return point
+
+    # ---- arm pit
+    armpit = xextreme("armpit", 2, 1, xmin=tall * 3.5) + (sign * tall, 0, -tall * 2)
+    # ---- hand
+    hand = xextreme("hand", 0, sign, max(width - tall, 0), width + tall)
+    # ---- elbow
+    midelbow = armpit * 0.5 + hand * 0.5
+    reach = sign * midelbow[0]
+    elbowbox = (max(reach - tall, 0), reach + tall, midelbow[2] - tall, midelbow[2] + tall)
+    elbow = xextreme("elbow", 1, 1, *elbowbox) * 0.5 + xextreme("elbow", 1, -1, *elbowbox) * 0.5
+    # ---- wrist
+    wrist = xextreme("wrist", 1, 1, width * 0.9 - tall, width * 0.9 + tall) - (0, tall, 0)
+    # ---- knee, ankle, toe
+    knee = xextreme("knee", 1, -1, xmin=0, zmin=tall * 14, zmax=tall * 16) + (0, tall, 0)
+    ankle = xextreme("ankle", 1, -1, xmin=0, zmin=tall * 3, zmax=tall * 5) + (0, tall * 1.5, 0)
+    toe = xextreme("toe", 1, -1, xmin=0, zmin=0, zmax=tall * 2) + (0, tall * 2, 0)
+
+    found = {"armpit": armpit, "hand": hand, "elbow": elbow, "wrist": wrist, "knee": knee, "ankle": ankle, "toe": toe}
+    return {name: [float(c) for c in found[name]] for name in LIMB_MARKS}
+
+
+def marks_sides(marks):
+    """Sides the landmarks place limbs on: ["L"] or ["L", "R"]."""
+    return ["L", "R"] if marks.get("mirror") else ["L"]
+
+
+def side_limbs(marks, side):
+    """Limb landmarks of side, the right side mirrored from the left when symmetric."""
+    if side == "L":
+        return {name: marks[name] for name in LIMB_MARKS}
+    if "right" in marks:
+        return marks["right"]
+    return {name: [-marks[name][0], *marks[name][1:]] for name in LIMB_MARKS}
+
+
+# ------------------- bone layout --------------#
+# Bone positions of the rig for a set of landmarks
+# Returned as ordered (bone, "head" or "tail", (x, y, z)) writes: connected bones
+# share a joint, so later writes win the same way they do on edit bones
+def rig_layout(marks, sides=None):
+    """Ordered edit bone position writes that place the rig on marks, limbs of sides only if given."""
+    tall = marks["tall"]
+    spine_z, spine_y = marks["spine_z"], marks["spine_y"]
+    writes = []
+    for i, name in enumerate(SPINE_BONES):
+        writes.append((name, "head", (0.0, spine_y[i], spine_z[i])))
+        writes.append((name, "tail", (0.0, spine_y[i], spine_z[i + 1])))
+
+    for side in marks_sides(marks) if sides is None else sides:
+        sign = SIDES[side]
+        limbs = side_limbs(marks, side)
+        shoulder, upper_arm, forearm, hand = side_bones(ARM_BONES, side)
+        thigh, shin, foot, toe_bone = side_bones(LEG_BONES, side)
+
+        # ---- arm pit, shoulder, hand, elbow, wrist
+        armpit = np.asarray(limbs["armpit"], dtype=np.float64)
+        writes.append((upper_arm, "head", tuple(armpit)))
+        writes.append((shoulder, "tail", tuple(armpit + (0, 0, tall))))
+        writes.append((shoulder, "head", tuple(armpit + (-sign * tall * 4, 0, 0))))
+        writes.append((hand, "tail", tuple(limbs["hand"])))
+        writes.append((upper_arm, "tail", tuple(limbs["elbow"])))
+        writes.append((forearm, "tail", tuple(limbs["wrist"])))
+
+        # ---- thigh, knee, ankle, foot, toe
+        toe = np.asarray(limbs["toe"], dtype=np.float64)
+        writes.append((thigh, "head", (sign * 2.5 * tall, spine_y[0], spine_z[0])))
+        writes.append((thigh, "tail", tuple(limbs["knee"])))
+        writes.append((shin, "tail", tuple(limbs["ankle"])))
+        writes.append((foot, "tail", tuple(toe)))
+        writes.append((toe_bone, "tail", tuple(toe - (0, 2 * tall, 0))))
+    return [(name, end, tuple(float(c) for c in co)) for name, end, co in writes]
+
+
+def joint_deviation(marks, reference):
+    """Distance of every bone head and tail placed on marks from where reference places it.
+
+    Returns {"bone.head": distance}, over the limb sides both landmark sets have."""
+    sides = [side for side in marks_sides(marks) if side in marks_sides(reference)]
+    return {
+        f"{name}.{end}": float(np.linalg.norm(np.subtract(co, ref)))
+        for (name, end, co), (_, _, ref) in zip(rig_layout(marks, sides), rig_layout(reference, sides))
+    }
@@ -0,0 +1,99 @@
+import numpy as np
+
+from .landmarks import symmetry
+from .proxy import bounds
+
+
+# ------------------- body frame --------------#
+# Orientation of a humanoid point cloud, found without touching the mesh
+# The landmark heuristics expect the body Z up, facing -Y, centred on x = 0 with
+# the feet on z = 0. body_frame finds that frame from the principal axes of a vertex
+# subsample: depth is the axis of least variance, and of the two others the side
+# axis is the one the body is mirror symmetric across (arm span and height are
+# close in a T pose, so the variances alone cannot tell them apart)
+# Up follows the world up hint when it is close to it, else the end with the arms;
+# the front is the way the toes point, else the front hint. Axes within SNAP_COS of
+# a world axis are snapped to it: the toes and the nose tilt the principal axes a
+# little, and a model built upright should keep its exact upright frame
+ORIENT_SAMPLES = 20000
+HINT_COS = 0.7
+SNAP_COS = 0.999
+UP_HINT = (0.0, 0.0, 1.0)
+FRONT_HINT = (0.0, -1.0, 0.0)
+
+
+def body_frame(points, samples=ORIENT_SAMPLES, up_hint=UP_HINT, front_hint=FRONT_HINT):
+    """4x4 matrix taking body frame coordinates to the coordinates of points."""
+    sample = points[:: max(len(points) // samples, 1)].astype(np.float64)
+    centred = sample - sample.mean(axis=0)
+    _, vectors = np.linalg.eigh(centred.T @ centred)
+    depth, first, second = vectors[:, 0], vectors[:, 2], vectors[:, 1]
+
+    # ---- side: the axis the body mirrors across
+    def mirror_score(side, up):
+        local = centred @ np.stack([side, depth, up], axis=1)
+        return symmetry(local, float(np.ptp(local[:, 2])) / 114)
+
+    if mirror_score(second, first) >= mirror_score(first, second):
+        side, up = second, first
+    else:
+        side, up = first, second
+
+    # ---- up: the hint, else the half with the wider side extent (the arms)
+    if abs(up @ up_hint) >= HINT_COS:
+        up = up * np.sign(up @ up_hint)
+    else:
+        height = centred @ up
+        reach = np.abs(centred @ side)
+        middle = (height.min() + height.max()) / 2
+        if np.percentile(reach[height > middle], 95) < np.percentile(reach[height <= middle], 95):
+            up = -up
+
+    # ---- front: the toes point forward of the shins
+    height = centred @ up
+    low, span = height.min(), np.ptp(height)
+    along = centred @ depth
+    feet = along[height < low + span * 0.04]
+    shins = along[(height > low + span * 0.1) & (height < low + span * 0.2)]
+    shift = feet.mean() - shins.mean() if len(feet) and len(shins) else 0.0
+    if abs(shift) > span * 0.005:
+        front = depth * np.sign(shift)
+    else:
+        front = depth * (np.sign(depth @ front_hint) or 1)
+
+    up = snapped(up)
+    front = snapped(front - (front @ up) * up)
+    front = front - (front @ up) * up
+    front /= np.linalg.norm(front)
+
+    # ---- x = y cross z with y to the back, so the left side is +x
+    back = -front
+    rotation = np.stack([np.cross(back, up), back, up], axis=1)
+    return floor_frame(points, rotation)
+
+
+def snapped(axis):
+    """axis normalized, or the signed world axis nearest to it when within SNAP_COS."""
+    axis = axis / np.linalg.norm(axis)
+    nearest = np.argmax(np.abs(axis))
+    world = np.eye(3)[nearest] * np.sign(axis[nearest])
+    return world if axis @ world >= SNAP_COS else axis
+
+
+def floor_frame(points, rotation=None):
+    """4x4 matrix of the frame with axes rotation (world axes by default) and its origin
+    at the feet centre of points: centred on x and y, on the lowest point in z."""
+    rotation = np.eye(3) if rotation is None else rotation
+    low, high = bounds(points @ rotation.astype(points.dtype))
+    centre = np.array([(low[0] + high[0]) / 2, (low[1] + high[1]) / 2, low[2]])
+    frame = np.eye(4)
+    frame[:3, :3] = rotation
+    frame[:3, 3] = rotation @ centre
+    return frame
+
+
+def to_frame(points, frame):
+    """Coordinates in frame of points, frame being a rigid 4x4 matrix into their space."""
+    frame = np.asarray(frame, dtype=np.float64)
+    rotation = frame[:3, :3].astype(points.dtype)
+    return (points - frame[:3, 3].astype(points.dtype)) @ rotation
@@ -0,0 +1,74 @@
+import numpy as np
+
+
+# ------------------- voxel proxy --------------#
+# Bounded size stand-in for a dense point cloud
+# Points are binned on a voxel grid and every occupied voxel is replaced by the
+# centroid of its points. The landmark heuristics only look at the body shape, so
+# a few ten thousand points carry the same joints as a multi million vertex sculpt
+# The voxel size is estimated on a strided sample, which sees fewer occupied voxels
+# than the whole cloud, so the estimate is widened by SIZING_MARGIN and grown
+# further until the proxy fits
+# Grids up to DENSE_CELLS voxels are binned with bincount, larger ones by sorting
+SIZING_SAMPLES = 4
+SIZING_STEPS = 3
+SIZING_MARGIN = 1.12
+DENSE_CELLS = 1 << 23
+
+
+def bounds(points):
+    """(low, high) corners of points, reduced one column at a time (much faster than axis=0)."""
+    return (
+        np.array([points[:, axis].min() for axis in range(3)], dtype=np.float64),
+        np.array([points[:, axis].max() for axis in range(3)], dtype=np.float64),
+    )
+
+
+def voxel_keys(points, voxel, low, high):
+    """(keys, cells): integer key of the voxel holding each point and the voxel count of the grid."""
+    # one spare layer for float32 rounding at high
+    span = ((high - low) // voxel).astype(np.int64) + 2
+    # offsets from low are positive, truncation is the floor
+    scaled = points - low.astype(points.dtype)
+    scaled *= points.dtype.type(1 / voxel)
+    ijk = scaled.astype(np.int32)
+    return (ijk[:, 0].astype(np.int64) * span[1] + ijk[:, 1]) * span[2] + ijk[:, 2], int(np.prod(span))
+
+
+def voxel_downsample(points, voxel, low=None, high=None):
+    """Centroids (M, 3) of the points of every occupied voxel, in the dtype of points."""
+    if low is None or high is None:
+        low, high = bounds(points)
+    keys, cells = voxel_keys(points, voxel, low, high)
+    if cells <= DENSE_CELLS:
+        counts = np.bincount(keys, minlength=cells)
+        occupied = np.flatnonzero(counts)
+        sums = np.stack([np.bincount(keys, weights=points[:, axis], minlength=cells)[occupied] for axis in range(3)], axis=1)
+        counts = counts[occupied]
+    else:
+        order = np.argsort(keys)
+        keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        sums = np.add.reduceat(points[order].astype(np.float64), starts, axis=0)
+        counts = np.diff(np.r_[starts, len(keys)])
+    return (sums / counts[:, None]).astype(points.dtype)
+
+
+def proxy_points(points, budget):
+    """Return (proxy, voxel): at most budget points standing in for points.
+
+    Points that already fit the budget, or a budget of 0, are returned as they are with voxel 0."""
+    if budget <= 0 or len(points) <= budget:
+        return points, 0.0
+    low, high = bounds(points)
+    # a surface fills a number of voxels that goes with the inverse square of their size
+    sample = points[:: max(len(points) // (budget * SIZING_SAMPLES), 1)]
+    voxel = max(float((high - low).max()) / np.sqrt(budget), 1e-9)
+    for _ in range(SIZING_STEPS):
+        voxel *= np.sqrt(len(np.unique(voxel_keys(sample, voxel, low, high)[0])) / budget)
+    voxel *= SIZING_MARGIN
+    proxy = voxel_downsample(points, voxel, low, high)
+    while len(proxy) > budget:
+        voxel *= np.sqrt(len(proxy) / budget) * 1.02
+        proxy = voxel_downsample(points, voxel, low, high)
+    return proxy, float(voxel)
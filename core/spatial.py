@@ -0,0 +1,84 @@
+import numpy as np
+
+
+# ------------------- spatial index --------------#
+# Spatial index over a point array, built once per operator run
+# Points are kept sorted by z for slab lookups (bisect on the sorted z values)
+# and bucketed into a uniform x/z grid for box lookups, so a query only touches
+# the candidate cells instead of scanning every vertex
+class SpatialIndex:
+    """Z-sorted slabs and a uniform x/z grid over an (N, 3) point array."""
+
+    max_cells = 512
+
+    def __init__(self, points, cell):
+        self.points = points
+        # ---- z slabs
+        self.z_order = np.argsort(points[:, 2], kind="stable")
+        self.sorted_z = points[self.z_order, 2]
+        # ---- x/z grid
+        if len(points):
+            self.origin = points[:, [0, 2]].min(axis=0)
+            extent = points[:, [0, 2]].max(axis=0) - self.origin
+        else:
+            self.origin = np.zeros(2, dtype=points.dtype)
+            extent = np.zeros(2, dtype=points.dtype)
+        self.cell = max(float(cell), float(extent.max()) / self.max_cells, 1e-6)
+        self.shape = (extent // self.cell).astype(np.int64) + 1
+        keys = self._cell_keys(points)
+        self.cell_order = np.argsort(keys, kind="stable")
+        counts = np.bincount(keys, minlength=int(self.shape[0] * self.shape[1]))
+        self.cell_start = np.concatenate(([0], np.cumsum(counts)))
+
+    def __len__(self):
+        return len(self.points)
+
+    def _cell_keys(self, points):
+        ij = ((points[:, [0, 2]] - self.origin) // self.cell).astype(np.int64)
+        ij = np.clip(ij, 0, self.shape - 1)
+        return ij[:, 0] * self.shape[1] + ij[:, 1]
+
+    def _cell_range(self, low, high, axis):
+        first = int((low - self.origin[axis]) // self.cell) if low is not None else 0
+        last = int((high - self.origin[axis]) // self.cell) if high is not None else self.shape[axis] - 1
+        return max(first, 0), min(last, self.shape[axis] - 1)
+
+    def slab(self, zmin, zmax):
+        """Indices of the points with zmin < z < zmax."""
+        lo = np.searchsorted(self.sorted_z, zmin, side="right")
+        hi = np.searchsorted(self.sorted_z, zmax, side="left")
+        return self.z_order[lo:max(lo, hi)]
+
+    def box(self, xmin=None, xmax=None, zmin=None, zmax=None):
+        """Indices of the points with xmin < x < xmax and zmin < z < zmax (None means unbounded)."""
+        if xmin is None and xmax is None:
+            return self.slab(-np.inf if zmin is None else zmin, np.inf if zmax is None else zmax)
+        i0, i1 = self._cell_range(xmin, xmax, 0)
+        k0, k1 = self._cell_range(zmin, zmax, 1)
+        if i0 > i1 or k0 > k1:
+            return np.empty(0, dtype=np.int64)
+        # cells of one grid column are contiguous in key order
+        rows = np.arange(i0, i1 + 1) * self.shape[1]
+        starts = self.cell_start[rows + k0]
+        ends = self.cell_start[rows + k1 + 1]
+        idx = np.concatenate([self.cell_order[s:e] for s, e in zip(starts, ends)])
+        pts = self.points[idx]
+        mask = np.ones(len(idx), dtype=bool)
+        if xmin is not None:
+            mask &= pts[:, 0] > xmin
+        if xmax is not None:
+            mask &= pts[:, 0] < xmax
+        if zmin is not None:
+            mask &= pts[:, 2] > zmin
+        if zmax is not None:
+            mask &= pts[:, 2] < zmax
+        return idx[mask]
+
+    def near(self, x, z, rx, rz=None):
+        """Indices of the points within rx of x and rz (default rx) of z."""
+        rz = rx if rz is None else rz
+        return self.box(x - rx, x + rx, z - rz, z + rz)
+
+    def take(self, idx):
+        """Points for an index array returned by a query."""
+        return self.points[idx]
@@ -0,0 +1,38 @@
+import numpy as np
+
+
+# ------------------- weight cleanup --------------#
+# Normalize, limit influences and prune vertex weights in one vectorized pass
+# Weights are kept sparse as (vertex, group, weight) entries, sorted per vertex by weight
+def clean_weights(rows, cols, weights, limit=4, threshold=0.01, normalize=True, targets=None):
+    """Return a keep mask and the new weights for (rows, cols, weights) entries.
+
+    Each vertex keeps at most limit entries with a normalized weight of at least
+    threshold, its strongest entry is always kept so no vertex ends up unweighted.
+    Normalized weights of a vertex sum to its entry of targets (1 by default), e.g.
+    what its locked groups leave over."""
+    weights = np.asarray(weights, dtype=np.float32)
+    if not len(weights):
+        return np.zeros(0, dtype=bool), weights
+    count = int(rows.max()) + 1
+    totals = np.bincount(rows, weights, minlength=count)
+    normalized = weights / np.where(totals > 0, totals, 1)[rows]
+
+    # rank of every entry inside its vertex, strongest first
+    order = np.lexsort((-normalized, rows))
+    sorted_rows = rows[order]
+    first = np.r_[0, np.flatnonzero(np.diff(sorted_rows)) + 1]
+    starts = np.repeat(first, np.diff(np.r_[first, len(order)]))
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order)) - starts
+
+    keep = (rank < limit) & (normalized >= threshold)
+    keep |= rank == 0
+    result = normalized if normalize else weights.copy()
+    if normalize:
+        kept = np.bincount(rows[keep], result[keep], minlength=count)
+        result = result / np.where(kept > 0, kept, 1)[rows]
+        if targets is not None:
+            result = result * np.asarray(targets, dtype=np.float32)[rows]
+    result[~keep] = 0
+    return keep, result.astype(np.float32)
@@ -0,0 +1,160 @@
+"""Rig every .blend/.obj/.fbx of a directory with a pool of blender --background workers.
+
+    python farm/run_farm.py scans/ --out rigged/ --workers 16 --retries 1 --timeout 900
+
+Each input is a job on a shared queue, N worker threads each take the next job and
+run farm/worker.py in its own Blender process, so the CPU use follows the worker
+count. A job that fails or runs past --timeout is retried, every input gets
+<out>/<name>.blend and <out>/<name>.json, and <out>/farm_report.json sums it up.
+Arguments after "--" are passed on to worker.py (e.g. -- --parent HEAT --ik shin.L).
+"""
+
+import argparse
+import json
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+WORKER = os.path.join(HERE, "worker.py")
+EXTENSIONS = (".blend", ".obj", ".fbx")
+# one Blender process per core, keep each of them on a single thread
+SINGLE_THREAD_ENV = {"OMP_NUM_THREADS": "1", "OPENBLAS_NUM_THREADS": "1", "MKL_NUM_THREADS": "1"}
+
+
+def find_inputs(directory, recursive):
+    found = []
+    for root, dirs, files in os.walk(directory):
+        found.extend(os.path.join(root, name) for name in files if name.lower().endswith(EXTENSIONS))
+        if not recursive:
+            break
+    return sorted(found)
+
+
+def job_name(path, directory):
+    """Output stem of path: its path below directory with the separators flattened and the
+    extension kept, so scan.obj and scan.fbx get scan_obj and scan_fbx."""
+    relative, extension = os.path.splitext(os.path.relpath(path, directory))
+    return relative.replace(os.sep, "__") + "_" + extension[1:]
+
+
+def unique_names(paths, directory):
+    """job_name of every path, numbered where two would share an output (also on case insensitive disks)."""
+    names, taken = [], set()
+    for path in paths:
+        name = stem = job_name(path, directory)
+        n = 2
+        while name.casefold() in taken:
+            name, n = f"{stem}_{n}", n + 1
+        taken.add(name.casefold())
+        names.append(name)
+    return names
+
+
+def run_job(job, args, extra):
+    """Run worker.py on one input until it succeeds or runs out of retries, return the job record."""
+    output = os.path.join(args.out, job["name"] + ".blend")
+    report = os.path.join(args.out, job["name"] + ".json")
+    command = [args.blender, "--background", "--factory-startup", "-noaudio", "--threads", "1", "--python-exit-code", "1"]
+    command += ["--python", WORKER, "--", "--input", job["input"], "--output", output, "--report", report, *extra]
+    env = dict(os.environ, **SINGLE_THREAD_ENV)
+    start = time.perf_counter()
+    for attempt in range(1, args.retries + 2):
+        job["attempts"] = attempt
+        if os.path.exists(report):
+            os.remove(report)
+        try:
+            result = subprocess.run(command, env=env, capture_output=True, text=True, timeout=args.timeout)
+        except subprocess.TimeoutExpired:
+            job["error"] = f"timed out after {args.timeout}s"
+            continue
+        details = {}
+        if os.path.exists(report):
+            # a worker killed while writing leaves a truncated report, that attempt failed
+            try:
+                with open(report) as f:
+                    details = json.load(f)
+            except (ValueError, OSError) as e:
+                details = {"error": f"unreadable report: {e}"}
+        if result.returncode == 0 and "error" not in details:
+            job.pop("error", None)
+            job.update(status="done", output=output)
+            break
+        job["error"] = details.get("error") or (result.stderr or result.stdout)[-2000:] or f"exit code {result.returncode}"
+    else:
+        job["status"] = "failed"
+    job["seconds"] = round(time.perf_counter() - start, 3)
+    job["report"] = report if os.path.exists(report) else None
+    return job
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    extra = argv[argv.index("--") + 1 :] if "--" in argv else []
+    argv = argv[: argv.index("--")] if "--" in argv else argv
+    parser = argparse.ArgumentParser(prog="run_farm.py", description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", help="directory of .blend/.obj/.fbx files")
+    parser.add_argument("--out", default="rigged", help="output directory")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Blender processes running at once")
+    parser.add_argument("--retries", type=int, default=1, help="extra attempts for a failed or timed out input")
+    parser.add_argument("--timeout", type=float, default=900, help="seconds one attempt may take")
+    parser.add_argument("--blender", default=os.environ.get("BLENDER", "blender"), help="Blender executable, $BLENDER by default")
+    parser.add_argument("--recursive", action="store_true", help="also take the inputs of subdirectories")
+    args = parser.parse_args(argv)
+
+    if shutil.which(args.blender) is None and not os.path.isfile(args.blender):
+        parser.error(f"Blender executable {args.blender!r} not found")
+    inputs = find_inputs(args.inputs, args.recursive)
+    if not inputs:
+        parser.error(f"no {'/'.join(EXTENSIONS)} files in {args.inputs}")
+    os.makedirs(args.out, exist_ok=True)
+
+    jobs = queue.Queue()
+    records = []
+    for path, name in zip(inputs, unique_names(inputs, args.inputs)):
+        record = {"input": path, "name": name, "status": "queued", "attempts": 0}
+        records.append(record)
+        jobs.put(record)
+    lock = threading.Lock()
+    finished = [0]
+
+    def work():
+        while True:
+            try:
+                job = jobs.get_nowait()
+            except queue.Empty:
+                return
+            run_job(job, args, extra)
+            with lock:
+                finished[0] += 1
+                print(f"[{finished[0]}/{len(records)}] {job['status']:<6} {job['seconds']:8.1f}s  {job['input']}", flush=True)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=work, daemon=True) for _ in range(max(1, min(args.workers, len(records))))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    failed = [job for job in records if job["status"] != "done"]
+    summary = {
+        "inputs": len(records),
+        "done": len(records) - len(failed),
+        "failed": len(failed),
+        "workers": len(threads),
+        "seconds": round(time.perf_counter() - start, 3),
+        "worker_args": extra,
+        "jobs": records,
+    }
+    with open(os.path.join(args.out, "farm_report.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    print(f"{summary['done']} rigged, {summary['failed']} failed in {summary['seconds']:.1f}s, report {os.path.join(args.out, 'farm_report.json')}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
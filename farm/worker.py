@@ -0,0 +1,172 @@
+"""Rig one input file inside blender --background, started by farm/run_farm.py.
+
+    blender --background --factory-startup --python farm/worker.py -- --input scan.obj --output scan.blend --report scan.json
+
+Loads a .blend, .obj or .fbx, fits the template armature with the add-on operators
+(generate rig, parent, IK, twist), saves the result and writes a JSON report with
+the step timings and the landmarks. Exits with 1 when a step fails.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import traceback
+
+import bpy
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), "benchmarks"))
+
+from addon import PACKAGE, activate, load_addon, select_bones, view3d_override  # noqa: E402
+from humanoid import build_armature  # noqa: E402
+
+REQUIRED_BONES = ("upper_arm.L", "forearm.L", "hand.L", "thigh.L", "shin.L", "foot.L", "toe.L")
+
+
+class StepFailed(Exception):
+    pass
+
+
+# ------------------- scene --------------#
+def load_input(path):
+    """Open or import path, return the objects it brought in."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".blend":
+        bpy.ops.wm.open_mainfile(filepath=path)
+        return list(bpy.context.scene.objects)
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    before = set(bpy.data.objects)
+    if ext == ".obj":
+        bpy.ops.wm.obj_import(filepath=path)
+    elif ext == ".fbx":
+        bpy.ops.import_scene.fbx(filepath=path)
+    else:
+        raise StepFailed(f"unsupported input {ext}")
+    return [obj for obj in bpy.data.objects if obj not in before]
+
+
+def pick_mesh(objects, name):
+    meshes = [obj for obj in objects if obj.type == "MESH" and (not name or obj.name == name)]
+    if not meshes:
+        raise StepFailed(f"no mesh {name!r} in the input" if name else "no mesh in the input")
+    return max(meshes, key=lambda obj: len(obj.data.vertices))
+
+
+def pick_armature(objects, template, template_object):
+    """An armature of the input with the rig bones, else the template, else a built one."""
+    for obj in objects:
+        if obj.type == "ARMATURE" and all(bn in obj.data.bones for bn in REQUIRED_BONES):
+            return obj
+    if template:
+        with bpy.data.libraries.load(template, link=False) as (data_from, data_to):
+            data_to.objects = [name for name in data_from.objects if not template_object or name == template_object]
+        armatures = [obj for obj in data_to.objects if obj is not None and obj.type == "ARMATURE"]
+        if not armatures:
+            raise StepFailed(f"no armature {template_object!r} in {template}")
+        bpy.context.scene.collection.objects.link(armatures[0])
+        return armatures[0]
+    return build_armature("rig")
+
+
+# ------------------- steps --------------#
+class Worker:
+    def __init__(self, perf):
+        self.perf = perf
+        self.override = view3d_override()
+        self.steps = {}
+
+    def op(self, label, idname, setup, **props):
+        """Run bpy.ops.<idname> after setup, record its time, raise StepFailed unless it finished."""
+        setup()
+        category, name = idname.split(".")
+        self.perf.stats.clear()
+        start = time.perf_counter()
+        try:
+            with bpy.context.temp_override(**self.override):
+                result = getattr(getattr(bpy.ops, category), name)(**props)
+        except RuntimeError as e:
+            result, error = {"CANCELLED"}, str(e).strip()
+        else:
+            error = "" if "FINISHED" in result else f"returned {sorted(result)}"
+        step = {"ms": round((time.perf_counter() - start) * 1000, 3)}
+        phases = self.perf.as_dict().get(idname, {}).get("phases", {})
+        if phases:
+            step["phases_ms"] = {phase: round(timing["last"] * 1000, 3) for phase, timing in phases.items()}
+        if error:
+            step["error"] = error
+        self.steps[label] = step
+        if error:
+            raise StepFailed(f"{label}: {error}")
+
+
+def rig_file(args, report):
+    addon = load_addon()
+    landmark_cache = sys.modules[PACKAGE + ".operators.landmark_cache"]
+    perf = sys.modules[PACKAGE + ".operators.perf"]
+
+    start = time.perf_counter()
+    objects = load_input(args.input)
+    human = pick_mesh(objects, args.object)
+    armature = pick_armature(objects, args.template, args.template_object)
+    report["steps"]["load"] = {"ms": round((time.perf_counter() - start) * 1000, 3)}
+    report["mesh"] = human.name
+    report["vertices"] = len(human.data.vertices)
+    report["armature"] = armature.name
+
+    scene = bpy.context.scene
+    scene.my_object = human
+    scene.my_armature = armature
+    worker = Worker(perf)
+    worker.steps = report["steps"]
+    worker.op("generate_rig", "fg.generate_rig", lambda: activate(armature), use_cache=not args.no_cache, proxy=args.proxy, evaluated=args.modifiers)
+    report["landmarks"] = landmark_cache.latest_landmarks(human)
+
+    if args.parent != "NONE":
+        worker.op("autoparent", "fg.autoparent", lambda: activate(human), method=args.parent)
+    for limb in [n.strip() for n in args.ik.split(",") if n.strip()]:
+        worker.op(f"generate_ik[{limb}]", "fg.generate_ik", lambda: (activate(armature), select_bones(armature, {limb}, limb)))
+    if args.twist_up or args.twist_down:
+        worker.op("twist_limbs", "fg.twist_limbs", lambda: activate(armature), up_limbs=args.twist_up, down_limbs=args.twist_down)
+
+    start = time.perf_counter()
+    activate(armature)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    bpy.ops.wm.save_as_mainfile(filepath=os.path.abspath(args.output), copy=True)
+    report["steps"]["save"] = {"ms": round((time.perf_counter() - start) * 1000, 3)}
+    report["output"] = args.output
+    addon.unregister()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="worker.py", description=__doc__.splitlines()[0])
+    parser.add_argument("--input", required=True)
+    parser.add_argument("--output", required=True, help=".blend file the rigged scene is saved to")
+    parser.add_argument("--report", required=True, help="JSON report path")
+    parser.add_argument("--object", default="", help="mesh to rig, the largest mesh when empty")
+    parser.add_argument("--template", default="", help=".blend with the template armature, a built Rigify style rig when empty")
+    parser.add_argument("--template-object", default="", help="armature object in the template file, the first armature when empty")
+    parser.add_argument("--parent", default="DISTANCE", choices=["DISTANCE", "HEAT", "NONE"])
+    parser.add_argument("--ik", default="shin.L,forearm.L", help="comma separated bones that get an IK chain")
+    parser.add_argument("--twist-up", default="upper_arm.L, thigh.L")
+    parser.add_argument("--twist-down", default="forearm.L, shin.L")
+    parser.add_argument("--proxy", type=int, default=50000, help="landmark proxy points, 0 fits every vertex")
+    parser.add_argument("--modifiers", action="store_true", help="fit the mesh with its modifiers applied")
+    parser.add_argument("--no-cache", action="store_true", help="ignore the landmark cache of the input")
+    args = parser.parse_args(argv)
+
+    report = {"input": args.input, "blender": bpy.app.version_string, "steps": {}}
+    start = time.perf_counter()
+    try:
+        rig_file(args, report)
+    except Exception as e:
+        report["error"] = str(e) if isinstance(e, StepFailed) else traceback.format_exc()
+    report["seconds"] = round(time.perf_counter() - start, 3)
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    sys.exit(1 if "error" in report else 0)
+
+
+if __name__ == "__main__":
+    main(sys.argv[sys.argv.index("--") + 1 :] if "--" in sys.argv else [])
@@ -1,10 +1,10 @@
 import bpy
 
 
-from . import rig_create, modes, ikfksnap,twist
+from . import rig_create, modes, bonehash, ikchains, ikfksnap, twist, perf, batch, vertex_data
 
 
-modules = [rig_create, modes, ikfksnap, twist]
+modules = [rig_create, modes, bonehash, ikchains, ikfksnap, twist, perf, batch, vertex_data]
 
 
 def register():
@@ -0,0 +1,178 @@
+import time
+
+import bpy
+from mathutils import Matrix
+
+from ..core.landmarks import ARM_BONES, LEG_BONES
+from .perf import mode_set, phase, timed
+from .rig_create import MIRROR_ITEMS, ORIENT_ITEMS, PROXY_DESCRIPTION, PROXY_POINTS, distance_parent, fit_landmarks, write_rig_bones
+from .session import select_only, session
+
+
+# ------------------- batch rig --------------#
+# Fit a rig to every mesh of a collection in one operator call
+# Every mesh is paired with an armature: its parent armature, an armature named
+# <mesh>_rig, or a copy of the template armature made once its landmarks are found
+# (a mesh the landmarks fail on is reported and gets no rig). Landmarks are found
+# for all meshes first, then every rig is written in one multi-object EDIT session
+# and parented by bone distance, so the mode switches happen once per batch instead
+# of per mesh
+# Landmarks are measured in the body frame of each mesh, so the characters can stand
+# anywhere, turned any way. A new rig is placed on that frame; an existing rig keeps
+# its transform (moving it would move the mesh parented to it) and gets the bones
+# written through it
+RIG_SUFFIX = "_rig"
+
+
+def paired_rig(mesh):
+    """Existing armature of mesh: its parent armature or the <mesh>_rig object, else None."""
+    if mesh.parent is not None and mesh.parent.type == "ARMATURE":
+        return mesh.parent
+    rig = bpy.data.objects.get(mesh.name + RIG_SUFFIX)
+    return rig if rig is not None and rig.type == "ARMATURE" else None
+
+
+def usable_rig(rig, template, view_objects):
+    """Whether rig can be fitted: not the template, in the view layer and with the limb bones."""
+    return rig != template and rig.name in view_objects and all(bn in rig.data.bones for bn in ARM_BONES + LEG_BONES)
+
+
+def copy_template(template, mesh):
+    """New armature object for mesh from template, linked next to the mesh."""
+    rig = template.copy()
+    rig.data = template.data.copy()
+    rig.name = mesh.name + RIG_SUFFIX
+    rig.animation_data_clear()
+    # constraints of the copy still target the template
+    for pbone in rig.pose.bones:
+        for con in pbone.constraints:
+            if getattr(con, "target", None) == template:
+                con.target = rig
+            if getattr(con, "pole_target", None) == template:
+                con.pole_target = rig
+    collection = mesh.users_collection[0] if mesh.users_collection else bpy.context.scene.collection
+    collection.objects.link(rig)
+    return rig
+
+
+class BatchGenerateRig(bpy.types.Operator):
+    bl_idname = "fg.batch_generate_rig"
+    bl_label = "Batch rig collection"
+    bl_description = "Fit a rig from the template armature to every mesh of the collection"
+    bl_options = {"REGISTER", "UNDO"}
+
+    collection: bpy.props.StringProperty(name="Collection", default="", description="Collection of meshes, the panel collection when empty")
+    use_cache: bpy.props.BoolProperty(name="Use landmark cache", default=True, description="Reuse the landmarks cached on unchanged meshes")
+    mirror: bpy.props.EnumProperty(name="Mirror", items=MIRROR_ITEMS, default="AUTO")
+    proxy: bpy.props.IntProperty(name="Proxy points", default=PROXY_POINTS, min=0, description=PROXY_DESCRIPTION)
+    evaluated: bpy.props.BoolProperty(name="Use modifiers", default=False, description="Find the landmarks on the meshes with their modifiers applied")
+    orient: bpy.props.EnumProperty(name="Orientation", items=ORIENT_ITEMS, default="BODY")
+    parent: bpy.props.BoolProperty(name="Parent", default=True, description="Weight the meshes by bone distance and parent them to their rig")
+
+    @timed
+    def execute(self, context):
+        start = time.perf_counter()
+        scene = context.scene
+        collection = bpy.data.collections.get(self.collection) if self.collection else scene.fg_batch_collection
+        template = scene.my_armature
+        if collection is None:
+            self.report({"ERROR"}, "No collection set")
+            return {"CANCELLED"}
+        meshes = [obj for obj in collection.all_objects if obj.type == "MESH" and obj.data.vertices]
+        if not meshes:
+            self.report({"ERROR"}, f"No meshes in {collection.name}")
+            return {"CANCELLED"}
+
+        # ---- template, parsed once
+        required = ARM_BONES + LEG_BONES
+        if template is None or any(bn not in template.data.bones for bn in required):
+            self.report({"ERROR"}, "Template armature is missing or lacks the arm and leg bones")
+            return {"CANCELLED"}
+
+        # ---- pair meshes with their existing rigs, the template is copied once a mesh is fitted
+        view_objects = context.view_layer.objects
+        pairs, skipped, failed, created, cached = [], [], [], 0, 0
+        with phase("pairing"):
+            for mesh in meshes:
+                rig = paired_rig(mesh)
+                if rig is not None and not usable_rig(rig, template, view_objects):
+                    skipped.append(mesh.name)
+                    continue
+                pairs.append((mesh, rig))
+        if not pairs:
+            self.report({"ERROR"}, "No mesh could be paired with a rig: " + ", ".join(skipped))
+            return {"CANCELLED"}
+
+        # landmarks are read in OBJECT mode, the rigs are selected for EDIT once they all exist
+        with session(context, view_objects.active, "OBJECT"):
+            # ---- every mesh's landmarks
+            fits = []
+            for mesh, rig in pairs:
+                try:
+                    marks, hit = fit_landmarks(mesh, self.use_cache, self.mirror, self.proxy, self.evaluated, orient=self.orient)
+                except ValueError as e:
+                    failed.append(f"{mesh.name} ({e})")
+                    continue
+                frame = Matrix([marks["frame"][i : i + 4] for i in range(0, 16, 4)])
+                if rig is None:
+                    rig = copy_template(template, mesh)
+                    if not usable_rig(rig, template, view_objects):
+                        data = rig.data
+                        bpy.data.objects.remove(rig)
+                        bpy.data.armatures.remove(data)
+                        skipped.append(mesh.name)
+                        continue
+                    created += 1
+                    rig.matrix_world = frame
+                    matrix = None
+                else:
+                    # landmark frame -> world -> armature space
+                    matrix = rig.matrix_world.inverted() @ frame
+                cached += hit
+                fits.append((mesh, rig, marks, matrix))
+            if not fits:
+                self.report({"ERROR"}, "No mesh could be fitted: " + ", ".join(skipped + failed))
+                return {"CANCELLED"}
+
+            # ---- one EDIT session for every rig
+            for mesh, rig, marks, matrix in fits:
+                rig.data.pose_position = "REST"
+            select_only(context, [fit[1] for fit in fits], fits[0][1])
+            mode_set("EDIT")
+            for mesh, rig, marks, matrix in fits:
+                write_rig_bones(rig.data.edit_bones, marks, matrix)
+            mode_set("OBJECT")
+            for mesh, rig, marks, matrix in fits:
+                rig.data.pose_position = "POSE"
+
+            # ---- parent by bone distance, data only
+            unparented = []
+            if self.parent:
+                for mesh, rig, marks, matrix in fits:
+                    try:
+                        distance_parent(mesh, rig)
+                    except ValueError as e:
+                        unparented.append(f"{mesh.name} ({e})")
+
+        message = f"Fitted {len(fits)} rigs ({cached} cached, {created} new armatures) in {time.perf_counter() - start:.2f}s"
+        if skipped:
+            message += ", skipped " + ", ".join(skipped)
+        if failed:
+            message += ", not fitted " + ", ".join(failed)
+        if unparented:
+            message += ", not parented " + ", ".join(unparented)
+        self.report({"WARNING"} if skipped or failed or unparented else {"INFO"}, message)
+        return {"FINISHED"}
+
+
+classes = [BatchGenerateRig]
+
+
+def register():
+    for cls in classes:
+        bpy.utils.register_class(cls)
+
+
+def unregister():
+    for cls in reversed(classes):
+        bpy.utils.unregister_class(cls)
@@ -0,0 +1,83 @@
+import bpy
+from bpy.app.handlers import persistent
+
+
+# ------------------- bone head hash --------------#
+# Spatial hash of the rest pose bone heads of an armature
+# Heads are bucketed on a grid of the lookup tolerance, so the bones starting at a
+# point are found by checking the 27 neighbouring cells instead of every bone
+# Hashes are rebuilt when the armature's rest pose revision changes
+TOLERANCE = 0.01
+
+
+class BoneHeadHash:
+    """Bone heads of an armature bucketed by quantized rest position."""
+
+    def __init__(self, armature_data, cell=TOLERANCE):
+        self.cell = cell
+        self.cells = {}
+        for i, bone in enumerate(armature_data.bones):
+            head = bone.head_local
+            self.cells.setdefault(self._key(head), []).append((i, bone.name, head.copy()))
+
+    def _key(self, point):
+        return (round(point[0] / self.cell), round(point[1] / self.cell), round(point[2] / self.cell))
+
+    def at(self, point, tolerance=TOLERANCE):
+        """Names of the bones whose head is within tolerance of point on every axis, in bone order."""
+        reach = max(1, int(tolerance / self.cell + 0.5))
+        kx, ky, kz = self._key(point)
+        found = []
+        for x in range(kx - reach, kx + reach + 1):
+            for y in range(ky - reach, ky + reach + 1):
+                for z in range(kz - reach, kz + reach + 1):
+                    for i, name, head in self.cells.get((x, y, z), ()):
+                        if abs(head.x - point[0]) < tolerance and abs(head.y - point[1]) < tolerance and abs(head.z - point[2]) < tolerance:
+                            found.append((i, name))
+        return [name for _, name in sorted(found)]
+
+
+_revisions = {}
+_hashes = {}
+
+
+def rest_revision(armature_data):
+    """Counter that goes up every time the armature data is updated."""
+    return _revisions.get(armature_data.as_pointer(), 0)
+
+
+def bone_head_hash(armature_data):
+    """Cached BoneHeadHash of armature_data for its current rest revision."""
+    key = armature_data.as_pointer()
+    revision = rest_revision(armature_data)
+    cached = _hashes.get(key)
+    if cached is None or cached[0] != revision or cached[1] != len(armature_data.bones):
+        cached = _hashes[key] = (revision, len(armature_data.bones), BoneHeadHash(armature_data))
+    return cached[2]
+
+
+@persistent
+def _on_depsgraph_update(scene, depsgraph):
+    for update in depsgraph.updates:
+        if isinstance(update.id, bpy.types.Armature):
+            key = update.id.original.as_pointer()
+            _revisions[key] = _revisions.get(key, 0) + 1
+
+
+@persistent
+def _on_load(*args):
+    _hashes.clear()
+    _revisions.clear()
+
+
+def register():
+    bpy.app.handlers.depsgraph_update_post.append(_on_depsgraph_update)
+    bpy.app.handlers.load_post.append(_on_load)
+
+
+def unregister():
+    if _on_load in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(_on_load)
+    if _on_depsgraph_update in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(_on_depsgraph_update)
+    _on_load()
@@ -0,0 +1,45 @@
+# ------------------- constraint sync --------------#
+# Generators describe the constraints they want instead of rebuilding them
+# A spec is (name, type, {property: value}). Existing constraints are matched by
+# name and type, only properties that differ are written, and constraints are
+# only added or removed when the spec asks for it, so re-running a generator on
+# a rig that is already set up does not touch the depsgraph relations
+def sync_constraints(pbone, specs, managed=()):
+    """Make the constraints of pbone match specs, return (added, updated, removed) counts.
+
+    Constraints whose type is in managed but that are not in specs are removed,
+    any other constraint on the bone is left alone."""
+    constraints = pbone.constraints
+    wanted = {name: ctype for name, ctype, _ in specs}
+    removed = 0
+    for con in list(constraints):
+        ctype = wanted.get(con.name)
+        if (ctype is None and con.type in managed) or (ctype is not None and ctype != con.type):
+            constraints.remove(con)
+            removed += 1
+
+    added = updated = 0
+    previous = -1
+    for name, ctype, props in specs:
+        con = constraints.get(name)
+        if con is None:
+            con = constraints.new(type=ctype)
+            con.name = name
+            added += 1
+        for key, value in props.items():
+            if not _same(getattr(con, key), value):
+                setattr(con, key, value)
+                updated += 1
+        # keep the specs in stack order
+        index = constraints.find(name)
+        if index < previous:
+            constraints.move(index, previous)
+            index = previous
+        previous = index
+    return added, updated, removed
+
+
+def _same(current, value):
+    if isinstance(value, float):
+        return abs(current - value) < 1e-6
+    return current == value
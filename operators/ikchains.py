@@ -0,0 +1,152 @@
+import bpy
+from bpy.app.handlers import persistent
+
+
+# ------------------- ik chain index --------------#
+# Per armature index of the IK chains, built once from the IK constraint scan
+# Chains are stored by bone name and looked up per bone in O(1), the index is
+# dropped when the armature data or an IK target changes
+# Removing or renaming an IK constraint only tags the object, so lookups check the
+# chains they return: a chain that lost a bone or its IK constraint, or a bone that
+# misses, rebuilds the index once. Bones that still miss on the rebuilt index are
+# remembered, so a bone outside any chain does not rebuild it on every lookup
+class IKChain:
+    """One IK chain: shin carries the IK constraint, thigh is its parent."""
+
+    def __init__(self, shin, thigh, ik, feet, pole, constraint):
+        self.shin = shin
+        self.thigh = thigh
+        self.ik = ik
+        self.feet = feet
+        self.pole = pole
+        self.constraint = constraint
+
+    @property
+    def names(self):
+        """Bone names in snap order: shin, thigh, ik control, feet, pole."""
+        names = [self.shin, self.thigh, self.ik, *self.feet]
+        if self.pole:
+            names.append(self.pole)
+        return names
+
+    def pose_bones(self, pose):
+        """Pose bones of the chain in snap order, None if a bone or the IK constraint no longer exists."""
+        bones = pose.bones
+        try:
+            chain = [bones[name] for name in self.names]
+        except KeyError:
+            return None
+        constraint = chain[0].constraints.get(self.constraint)
+        if constraint is None or constraint.type != "IK":
+            return None
+        return chain
+
+
+class ChainIndex:
+    """All IK chains of an armature and a bone name -> chain map."""
+
+    def __init__(self, armature):
+        self.data = armature.data.as_pointer()
+        self.chains = []
+        self.by_bone = {}
+        self.misses = set()
+        pb = armature.pose.bones
+        for b in pb:
+            for constraint in b.constraints:
+                if constraint.type != "IK" or constraint.subtarget == "" or constraint.subtarget not in pb:
+                    continue
+                if b.parent is None:
+                    continue
+                iktarget = pb[constraint.subtarget]
+                feet = [c.name for c in iktarget.children] + [c.name for c in b.children]
+                pole = constraint.pole_subtarget if constraint.pole_subtarget in pb else ""
+                chain = IKChain(b.name, b.parent.name, iktarget.name, feet, pole, constraint.name)
+                self.chains.append(chain)
+                for name in chain.names:
+                    self.by_bone.setdefault(name, chain)
+
+    def chain_of(self, name):
+        """Chain containing bone name, or None."""
+        return self.by_bone.get(name)
+
+
+_indexes = {}
+_owner = object()
+
+
+def get_chain_index(armature):
+    """Cached ChainIndex of armature, built on first use."""
+    key = armature.as_pointer()
+    index = _indexes.get(key)
+    if index is None or index.data != armature.data.as_pointer():
+        index = _indexes[key] = ChainIndex(armature)
+    return index
+
+
+def checked_chain_index(armature, names=()):
+    """get_chain_index, rebuilt once when one of its chains is stale or one of names misses."""
+    index = get_chain_index(armature)
+    pose = armature.pose
+    stale = any(chain.pose_bones(pose) is None for chain in index.chains)
+    if stale or any(index.chain_of(name) is None and name not in index.misses for name in names):
+        invalidate(armature)
+        index = get_chain_index(armature)
+        index.misses.update(name for name in names if index.chain_of(name) is None)
+    return index
+
+
+def find_chain(armature, name):
+    """Return (chain, pose bones in snap order) for bone name, or (None, None)."""
+    chain = checked_chain_index(armature, (name,)).chain_of(name)
+    bones = chain.pose_bones(armature.pose) if chain is not None else None
+    if bones is None:
+        return None, None
+    return chain, bones
+
+
+def invalidate(armature=None):
+    """Drop the index of armature, or every index."""
+    if armature is None:
+        _indexes.clear()
+    else:
+        _indexes.pop(armature.as_pointer(), None)
+
+
+@persistent
+def _on_depsgraph_update(scene, depsgraph):
+    if not _indexes:
+        return
+    changed = {update.id.original.as_pointer() for update in depsgraph.updates if isinstance(update.id, bpy.types.Armature)}
+    if changed:
+        for key in [k for k, index in _indexes.items() if index.data in changed]:
+            del _indexes[key]
+
+
+def _on_target_change(*args):
+    invalidate()
+
+
+def _subscribe():
+    for key in ((bpy.types.KinematicConstraint, "subtarget"), (bpy.types.KinematicConstraint, "pole_subtarget"), (bpy.types.PoseBone, "constraints")):
+        bpy.msgbus.subscribe_rna(key=key, owner=_owner, args=(), notify=_on_target_change)
+
+
+@persistent
+def _on_load(*args):
+    invalidate()
+    _subscribe()
+
+
+def register():
+    bpy.app.handlers.depsgraph_update_post.append(_on_depsgraph_update)
+    bpy.app.handlers.load_post.append(_on_load)
+    _subscribe()
+
+
+def unregister():
+    bpy.msgbus.clear_by_owner(_owner)
+    if _on_load in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(_on_load)
+    if _on_depsgraph_update in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(_on_depsgraph_update)
+    invalidate()
@@ -1,7 +1,153 @@
+import time
+
 import bpy
+import numpy as np
 from bpy.types import Operator
 from mathutils import Matrix
 
+from .ikchains import checked_chain_index, find_chain
+from .perf import mode_set, phase, timed
+
+
+# ------------------- snap targets --------------#
+# Pose space matrices a chain snaps to for the current evaluated pose
+# Every chain bone keeps its visual matrix, when the IK is blended out the IK
+# control and the pole are moved onto the FK pose as well
+def snap_targets(chain, ikbones):
+    targets = [b.matrix.copy() for b in ikbones]
+    con = ikbones[0].constraints.get(chain.constraint)
+    if con is not None and con.influence < 1:
+        IK_relative_to_Fk = ikbones[0].bone.matrix_local.inverted() @ ikbones[2].bone.matrix_local
+        targets[2] = ikbones[0].matrix @ IK_relative_to_Fk
+        if chain.pole:
+            PV_normal = ((ikbones[0].vector + ikbones[1].vector * -1)).normalized()
+            PV_matrix_loc = ikbones[0].matrix.to_translation() + (PV_normal * ikbones[0].length * -3)
+            targets[-1] = Matrix.LocRotScale(PV_matrix_loc, ikbones[-1].matrix.to_quaternion(), None)
+    return targets
+
+
+# ------------------- analytic snap --------------#
+# Local (basis) matrices for pose space targets, computed from the rest matrices
+# The chain is solved parent to child in one pass: a bone whose parent is in the
+# chain is placed under the parent's new matrix, so no depsgraph update is needed
+# between bones. Assumes the default inherit rotation/scale settings
+def chain_bases(ikbones, targets):
+    solved = {}
+    bases = [None] * len(ikbones)
+    for i in sorted(range(len(ikbones)), key=lambda i: len(ikbones[i].parent_recursive)):
+        b = ikbones[i]
+        bone = b.bone
+        if bone.parent is None:
+            bases[i] = bone.matrix_local.inverted() @ targets[i]
+        else:
+            parent_matrix = solved.get(bone.parent.name, b.parent.matrix)
+            rest = bone.parent.matrix_local.inverted() @ bone.matrix_local
+            bases[i] = (parent_matrix @ rest).inverted() @ targets[i]
+        solved[b.name] = targets[i]
+    return bases
+
+
+def snap_chain(context, chain, ikbones):
+    """Snap a chain analytically, with a single depsgraph update at the end."""
+    for b, basis in zip(ikbones, chain_bases(ikbones, snap_targets(chain, ikbones))):
+        b.matrix_basis = basis
+    context.view_layer.update()
+
+
+def snap_chain_per_bone(context, chain, ikbones):
+    """Snap a chain with one depsgraph update per bone, the benchmark baseline."""
+    for b, target in zip(ikbones, snap_targets(chain, ikbones)):
+        b.matrix = target
+        context.view_layer.update()
+
+
+# ------------------- bulk keys --------------#
+# Write whole F-curves at once: existing keys on the baked frames are replaced,
+# the rest are kept with their handles, easing and key type, and every curve is
+# filled with one add + foreach_set. Only the new keys get default handles
+# A single frame goes through insert_keys, which adds its keys in place
+KEY_ATTRS = (
+    ("handle_left", 2, np.float32),
+    ("handle_right", 2, np.float32),
+    ("handle_left_type", 1, np.int32),
+    ("handle_right_type", 1, np.int32),
+    ("interpolation", 1, np.int32),
+    ("easing", 1, np.int32),
+    ("type", 1, np.int32),
+)
+
+
+def bone_path(name, prop):
+    return f'pose.bones["{bpy.utils.escape_identifier(name)}"].{prop}'
+
+
+def read_points(points, attr, size, dtype):
+    values = np.empty(len(points) * size, dtype=dtype)
+    points.foreach_get(attr, values)
+    return values.reshape(len(points), size)
+
+
+def key_fcurves(obj, keys):
+    """(fcurve, frames, values) for keys, creating the action and the missing F-curves."""
+    if obj.animation_data is None:
+        obj.animation_data_create()
+    action = obj.animation_data.action
+    if action is None:
+        action = obj.animation_data.action = bpy.data.actions.new(obj.name + "Action")
+    for (path, index, group), (frames, values) in keys.items():
+        fc = action.fcurves.find(path, index=index)
+        if fc is None:
+            fc = action.fcurves.new(path, index=index, action_group=group)
+        yield fc, frames, values
+
+
+def insert_keys(obj, keys):
+    """Insert keys one by one like keyframe_insert, the other keys of the curves are untouched."""
+    for fc, frames, values in key_fcurves(obj, keys):
+        for frame, value in zip(frames.tolist(), values.tolist()):
+            fc.keyframe_points.insert(frame, value, options={"FAST"})
+        fc.update()
+
+
+def write_keys(obj, keys):
+    """keys maps (data_path, array_index, group) to (frames, values) arrays."""
+    for fc, frames, values in key_fcurves(obj, keys):
+        points = fc.keyframe_points
+        old = read_points(points, "co", 2, np.float32)
+        kept = ~np.isin(np.rint(old[:, 0]), np.rint(frames))
+        saved = {attr: read_points(points, attr, size, dtype)[kept] for attr, size, dtype in KEY_ATTRS}
+        co = np.concatenate((old[kept], np.column_stack((frames, values)).astype(np.float32)))
+        order = np.argsort(co[:, 0], kind="stable")
+        # ---- positions of the kept keys in the new curve, and where they came from
+        from_old = order < len(saved["type"])
+        if hasattr(points, "clear"):
+            points.clear()
+        else:
+            while len(points):
+                points.remove(points[-1], fast=True)
+        points.add(len(co))
+        points.foreach_set("co", co[order].ravel())
+        for attr, size, dtype in KEY_ATTRS:
+            data = read_points(points, attr, size, dtype)
+            data[from_old] = saved[attr][order[from_old]]
+            points.foreach_set(attr, data.ravel())
+        fc.update()
+
+
+def chain_key_frames(obj, names):
+    """Frames of the existing keys on any bone in names."""
+    action = obj.animation_data.action if obj.animation_data else None
+    if action is None:
+        return []
+    prefixes = tuple(bone_path(name, "") for name in names)
+    frames = set()
+    for fc in action.fcurves:
+        if fc.data_path.startswith(prefixes):
+            co = np.empty(len(fc.keyframe_points) * 2, dtype=np.float32)
+            fc.keyframe_points.foreach_get("co", co)
+            frames.update(np.rint(co[::2]).astype(int).tolist())
+    return sorted(frames)
+
 
 class IKFKSnap(Operator):
     """Snap FK to IK or IK to FK"""
@@ -11,85 +157,172 @@ class IKFKSnap(Operator):
     bl_description = "IK or FK Snap"
     bl_options = {"REGISTER", "UNDO"}
 
+    bake: bpy.props.EnumProperty(
+        name="Bake",
+        items=[
+            ("CURRENT", "Current frame", "Snap on the current frame"),
+            ("RANGE", "Frame range", "Snap on every frame of the range"),
+            ("KEYS", "Keyframes", "Snap on the frames the chain already has keys on"),
+        ],
+        default="CURRENT",
+    )
+    use_scene_range: bpy.props.BoolProperty(name="Scene range", default=True, description="Bake the scene frame range")
+    frame_start: bpy.props.IntProperty(name="Start", default=1)
+    frame_end: bpy.props.IntProperty(name="End", default=250)
+    scope: bpy.props.EnumProperty(
+        name="Chains",
+        items=[
+            ("ACTIVE", "Active", "The chain of the active bone"),
+            ("SELECTED", "Selected", "Every chain with a selected bone"),
+            ("ALL", "All", "Every IK chain of the armature"),
+        ],
+        default="ACTIVE",
+    )
+
+    @timed
     def execute(self, context):
-        print("---------------------IK/FK Snap------------------------")
         # bpy.ops.object.mode_set(mode="OBJECT")
-        bpy.ops.object.mode_set(mode="POSE")
+        mode_set("POSE")
         armature = context.active_object
         ac = context.active_pose_bone
         if armature is None or armature.type != "ARMATURE":
             self.report({"WARNING"}, "No armature selected")
             return {"CANCELLED"}
-        pb = armature.pose.bones
-        ik_bones = []
-        # Get all bones with IK constraints
-        i = 0
-        for b in pb:
-            for constraint in b.constraints:
-                if constraint.type == "IK":
-                    if constraint.subtarget != "":
-                        ik_bones.append([b])  #  1 shin
-                        ik_bones[i].append(b.parent)  #  2 thigh
-
-                        iktargt = constraint.subtarget
-                        ik_bones[i].append(pb[iktargt])  # 3 ik ctrl bone
-                        for c in pb[iktargt].children:
-                            ik_bones[i].append(c)  # 4 foot
-                        for c in b.children:
-                            ik_bones[i].append(c)  # 4 foot
-
-                        pole_target = constraint.pole_subtarget
-                        if pole_target != "":
-                            ik_bones[i].append(pb[pole_target])  # 5 pole target bone
-                            # for c in pb[pole_target].children:
-                            #     ik_bones[i].append(c)  # 5+ pole target bone child
-                        i += 1
-        # print("IK bones: ", ik_bones[1])
-        for i, b in enumerate(ik_bones):
-            for c in b:
-                if c == ac:
-                    ac = b[0]
-                    ikbones = b
-                    break
-        if ac == None:
+        chains = self.target_chains(context, armature, ac)
+        # a chain whose IK constraint went away since the index was checked is skipped
+        constraints = [bones[0].constraints.get(chain.constraint) for chain, bones in chains]
+        stale = [chain.shin for (chain, _), con in zip(chains, constraints) if con is None]
+        chains = [pair for pair, con in zip(chains, constraints) if con is not None]
+        constraints = [con for con in constraints if con is not None]
+        if not chains:
             self.report({"WARNING"}, "No IK constraint found")
             return {"CANCELLED"}
-        # print("IK bones: ", ikbones)
-        frame = context.scene.frame_current
-        copymatrx = [b.matrix.copy() for b in ikbones]
+        scene = context.scene
+        if self.bake == "CURRENT":
+            frames = [scene.frame_current]
+        elif self.bake == "KEYS":
+            frames = chain_key_frames(armature, {name for chain, _ in chains for name in chain.names})
+        elif self.use_scene_range:
+            frames = list(range(scene.frame_start, scene.frame_end + 1))
+        else:
+            frames = list(range(self.frame_start, self.frame_end + 1))
+        if not frames:
+            self.report({"WARNING"}, "Nothing to bake")
+            return {"CANCELLED"}
+
+        # ---- collect: every chain in one pass, one depsgraph evaluation per frame
+        names = [b.name for _, bones in chains for b in bones]
+        locations = np.empty((len(frames), len(names), 3), dtype=np.float32)
+        rotations = np.empty((len(frames), len(names), 4), dtype=np.float32)
+        influences = np.empty((len(frames), len(chains)), dtype=np.float32)
+        previous = [None] * len(names)
+        current = scene.frame_current
+        for f, frame in enumerate(frames):
+            if self.bake != "CURRENT":
+                with phase("depsgraph update"):
+                    scene.frame_set(frame)
+            with phase("snap solve"):
+                bases = []
+                for c, (chain, bones) in enumerate(chains):
+                    influences[f, c] = constraints[c].influence
+                    bases.extend(chain_bases(bones, snap_targets(chain, bones)))
+                for i, basis in enumerate(bases):
+                    location, rotation, _ = basis.decompose()
+                    if previous[i] is not None:
+                        rotation.make_compatible(previous[i])
+                    previous[i] = rotation
+                    locations[f, i] = location
+                    rotations[f, i] = rotation
+        with phase("depsgraph update"):
+            if self.bake == "CURRENT":
+                for b, basis in zip((b for _, bones in chains for b in bones), bases):
+                    b.matrix_basis = basis
+                context.view_layer.update()
+            else:
+                scene.frame_set(current)
+
+        # ---- write: one bulk fill per F-curve
+        frames = np.asarray(frames, dtype=np.float32)
+        keys = {}
+        for i, name in enumerate(names):
+            for axis in range(3):
+                keys[(bone_path(name, "location"), axis, name)] = (frames, locations[:, i, axis])
+            for axis in range(4):
+                keys[(bone_path(name, "rotation_quaternion"), axis, name)] = (frames, rotations[:, i, axis])
+        for c, (chain, _) in enumerate(chains):
+            path = bone_path(chain.shin, f'constraints["{bpy.utils.escape_identifier(chain.constraint)}"].influence')
+            keys[(path, 0, chain.shin)] = (frames, influences[:, c])
+        with phase("keyframe write"):
+            # a single frame snap only adds its keys, a bake rewrites the curves in bulk
+            if self.bake == "CURRENT":
+                insert_keys(armature, keys)
+            else:
+                write_keys(armature, keys)
+        if stale:
+            self.report({"WARNING"}, f"Snapped {len(chains)} chains over {len(frames)} frames, skipped stale chains on " + ", ".join(stale))
+        else:
+            self.report({"INFO"}, f"Snapped {len(chains)} chains over {len(frames)} frames")
+        return {"FINISHED"}
+
+    def target_chains(self, context, armature, ac):
+        """(chain, pose bones) pairs the operator works on, from the chain index."""
+        if self.scope == "ALL":
+            chains = checked_chain_index(armature).chains
+        elif self.scope == "SELECTED":
+            names = [b.name for b in context.selected_pose_bones or []]
+            index = checked_chain_index(armature, names)
+            chains = {index.chain_of(name) for name in names}
+            chains = [chain for chain in index.chains if chain in chains]
+        else:
+            chains = [find_chain(armature, ac.name)[0]] if ac else []
+        pose = armature.pose
+        chains = [(chain, chain.pose_bones(pose)) for chain in chains if chain is not None]
+        return [(chain, bones) for chain, bones in chains if bones is not None]
+
+
+class IKFKSnapBenchmark(Operator):
+    """Time the per-bone update snap against the analytic snap on the active chain"""
+
+    bl_idname = "fg.ikfksnap_benchmark"
+    bl_label = "IK/FK Snap benchmark"
+    bl_options = {"REGISTER"}
 
-        for i, b in enumerate(ikbones):
-            b.matrix = copymatrx[i]
+    repeats: bpy.props.IntProperty(name="Repeats", default=20, min=1)
+
+    def execute(self, context):
+        armature = context.active_object
+        ac = context.active_pose_bone
+        if armature is None or armature.type != "ARMATURE" or ac is None:
+            self.report({"WARNING"}, "No pose bone selected")
+            return {"CANCELLED"}
+        chain, ikbones = find_chain(armature, ac.name)
+        if chain is None:
+            self.report({"WARNING"}, "No IK constraint found")
+            return {"CANCELLED"}
+
+        saved = [b.matrix_basis.copy() for b in ikbones]
+
+        def restore():
+            for b, basis in zip(ikbones, saved):
+                b.matrix_basis = basis
             context.view_layer.update()
-            b.keyframe_insert(data_path="rotation_quaternion", frame=frame)
-            b.keyframe_insert(data_path="location", frame=frame)
-
-        for con in ac.constraints:
-            if con.type == "IK":
-                con.keyframe_insert(data_path="influence", frame=frame)
-                if con.influence < 1:
-                    IK_relative_to_Fk = ikbones[0].bone.matrix_local.inverted() @ ikbones[2].bone.matrix_local
-                    ikbones[2].matrix = ikbones[0].matrix @ IK_relative_to_Fk
-                    # bpy.context.view_layer.update()
-
-                    PV_normal = ((ikbones[0].vector + ikbones[1].vector*-1)).normalized()
-                    PV_matrix_loc = ikbones[0].matrix.to_translation() + (PV_normal * ac.length*-3)
-                    PV_matrix = Matrix.LocRotScale(PV_matrix_loc, ikbones[4].matrix.to_quaternion(), None)
-                    ikbones[4].matrix = PV_matrix
-                    # bpy.context.view_layer.update()
-
-                    ikbones[2].keyframe_insert(data_path="location", frame=frame)
-                    ikbones[2].keyframe_insert(data_path="rotation_quaternion", frame=frame)
-                    # ikbones[2].keyframe_insert(data_path="rotation_euler", frame=frame)
 
-        # bpy.ops.object.mode_set(mode="OBJECT")
-        # bpy.ops.object.mode_set(mode="POSE")
+        timings = {snap_chain_per_bone: 0.0, snap_chain: 0.0}
+        for _ in range(self.repeats):
+            for snap in timings:
+                restore()
+                start = time.perf_counter()
+                snap(context, chain, ikbones)
+                timings[snap] += time.perf_counter() - start
+        restore()
 
-        bpy.context.view_layer.update()
+        per_bone = timings[snap_chain_per_bone] / self.repeats * 1000
+        analytic = timings[snap_chain] / self.repeats * 1000
+        self.report({"INFO"}, f"per bone update {per_bone:.2f} ms, analytic {analytic:.2f} ms, x{per_bone / max(analytic, 1e-9):.1f}")
         return {"FINISHED"}
 
 
-classes = [IKFKSnap]
+classes = [IKFKSnap, IKFKSnapBenchmark]
 
 
 def register():
@@ -0,0 +1,74 @@
+import hashlib
+import json
+
+import numpy as np
+
+
+# ------------------- landmark cache --------------#
+# Landmarks found by GenerateRig are stored on the mesh object as a custom property
+# Entries are keyed by a cheap mesh fingerprint, so re-running the operator on an
+# unchanged mesh skips the mesh analysis and only rewrites the bones
+CACHE_PROP = "fg_landmarks"
+CACHE_VERSION = 1
+MAX_ENTRIES = 4
+SAMPLES = 64
+
+
+def mesh_fingerprint(obj, extra=()):
+    """Fingerprint of obj from its vertex count, bounding box and a sampled coordinate checksum."""
+    vertices = obj.data.vertices
+    count = len(vertices)
+    values = [count, CACHE_VERSION, *extra]
+    values.extend(c for row in obj.matrix_world for c in row)
+    values.extend(c for corner in obj.bound_box for c in corner)
+    if count:
+        for i in np.linspace(0, count - 1, min(SAMPLES, count)).astype(int):
+            values.extend(vertices[int(i)].co)
+    digest = hashlib.sha1(np.round(np.asarray(values, dtype=np.float64), 6).tobytes())
+    return f"{count}:{digest.hexdigest()[:16]}"
+
+
+def get_landmarks(obj, key):
+    """Return the cached landmarks of obj for key, or None."""
+    entries = obj.get(CACHE_PROP)
+    if not entries or key not in entries:
+        return None
+    entry = entries[key]
+    entry["stamp"] = _next_stamp(entries)
+    return json.loads(entry["data"])
+
+
+def latest_landmarks(obj):
+    """Return the most recently used landmarks cached on obj, or None."""
+    entries = obj.get(CACHE_PROP)
+    if not entries:
+        return None
+    key = max(entries.keys(), key=lambda k: entries[k]["stamp"])
+    return json.loads(entries[key]["data"])
+
+
+def store_landmarks(obj, key, landmarks):
+    """Store landmarks for key, dropping stale entries and keeping at most MAX_ENTRIES."""
+    entries = obj.get(CACHE_PROP)
+    entries = entries.to_dict() if entries else {}
+    count = key.split(":")[0]
+    # an entry made for another vertex count belongs to a mesh that no longer exists
+    entries = {k: v for k, v in entries.items() if k.split(":")[0] == count}
+    entries[key] = {"stamp": _next_stamp(entries), "data": json.dumps(landmarks)}
+    for old in sorted(entries, key=lambda k: entries[k]["stamp"])[: max(len(entries) - MAX_ENTRIES, 0)]:
+        del entries[old]
+    obj[CACHE_PROP] = entries
+
+
+def clear_landmarks(obj):
+    """Remove every cached landmark entry from obj, return how many were dropped."""
+    entries = obj.get(CACHE_PROP)
+    if entries is None:
+        return 0
+    count = len(entries)
+    del obj[CACHE_PROP]
+    return count
+
+
+def _next_stamp(entries):
+    return max((entries[k]["stamp"] for k in entries.keys()), default=0) + 1
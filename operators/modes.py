@@ -1,5 +1,7 @@
 import bpy
 
+from .perf import timed
+from .session import enter
 
 
 # ------------------modes-------------------#
@@ -8,15 +10,12 @@ class Weightpaintmode(bpy.types.Operator):
     bl_label = "weight paint mode"
     bl_options = {"REGISTER", "UNDO"}
 
+    @timed
     def execute(self, context):
-        bpy.ops.object.mode_set(mode="OBJECT")
-        bpy.ops.object.select_all(action="DESELECT")
         human = context.scene.my_object
         armatur = context.scene.my_armature
-        human.select_set(True)
-        armatur.select_set(True)
-        bpy.context.view_layer.objects.active = human
-        bpy.ops.paint.weight_paint_toggle()
+        # the selected armature lets bones be picked while painting
+        enter(context, human, "WEIGHT_PAINT", [human, armatur])
 
         return {"FINISHED"}
 
@@ -26,13 +25,10 @@ class Posemode(bpy.types.Operator):
     bl_label = "toggle pose mode"
     bl_options = {"REGISTER", "UNDO"}
 
+    @timed
     def execute(self, context):
-        bpy.ops.object.mode_set(mode="OBJECT")
-        bpy.ops.object.select_all(action="DESELECT")
         armatur = context.scene.my_armature
-        armatur.select_set(True)
-        bpy.context.view_layer.objects.active = armatur
-        bpy.ops.object.posemode_toggle()
+        enter(context, armatur, "POSE", [armatur])
 
         return {"FINISHED"}
 
@@ -0,0 +1,182 @@
+import cProfile
+import functools
+import io
+import json
+import pstats
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import bpy
+
+
+# ------------------- performance stats --------------#
+# Lightweight timing for the operators
+# An operator's execute is wrapped with @timed, inside it named phases are timed
+# with `with phase("vertex extract"):`. Every run adds its total and phase times
+# to rolling per-operator stats shown in the Performance panel. Events are counted
+# with count("name"), e.g. the mode switches made and avoided by mode_set
+HISTORY = 20
+PROFILE_TEXT = "fg_profile.txt"
+
+
+class Rolling:
+    """Call count and the last HISTORY durations (seconds) of one timer."""
+
+    def __init__(self):
+        self.calls = 0
+        self.times = deque(maxlen=HISTORY)
+
+    def add(self, seconds, calls=1):
+        self.calls += calls
+        self.times.append(seconds)
+
+    def as_dict(self):
+        times = list(self.times)
+        return {
+            "calls": self.calls,
+            "last": times[-1] if times else 0.0,
+            "mean": sum(times) / len(times) if times else 0.0,
+            "min": min(times, default=0.0),
+            "max": max(times, default=0.0),
+        }
+
+
+class OperatorStats:
+    def __init__(self):
+        self.total = Rolling()
+        self.phases = {}
+        self.counts = {}
+
+
+stats = {}
+_runs = []
+_counts = []
+
+
+@contextmanager
+def phase(name):
+    """Time a named phase of the running operator, a no-op outside @timed."""
+    if not _runs:
+        yield
+        return
+    run = _runs[-1]
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds, calls = run.get(name, (0.0, 0))
+        run[name] = (seconds + time.perf_counter() - start, calls + 1)
+
+
+def count(name, amount=1):
+    """Add amount to the counter name of the running operator, a no-op outside @timed."""
+    if _counts:
+        _counts[-1][name] = _counts[-1].get(name, 0) + amount
+
+
+def timed(execute):
+    """Decorator for Operator.execute recording the run under the operator's bl_idname."""
+
+    @functools.wraps(execute)
+    def wrapper(self, context):
+        profiler = None
+        scene = context.scene
+        if getattr(scene, "fg_profile_next", False):
+            scene.fg_profile_next = False
+            profiler = cProfile.Profile()
+        _runs.append({})
+        _counts.append({})
+        start = time.perf_counter()
+        try:
+            if profiler:
+                return profiler.runcall(execute, self, context)
+            return execute(self, context)
+        finally:
+            total = time.perf_counter() - start
+            run = _runs.pop()
+            counts = _counts.pop()
+            op = stats.setdefault(self.bl_idname, OperatorStats())
+            op.total.add(total)
+            for name, (seconds, calls) in run.items():
+                op.phases.setdefault(name, Rolling()).add(seconds, calls)
+            for name, amount in counts.items():
+                op.counts[name] = op.counts.get(name, 0) + amount
+            if profiler:
+                store_profile(self.bl_idname, profiler)
+
+    return wrapper
+
+
+def mode_set(mode):
+    """bpy.ops.object.mode_set timed as the "mode switch" phase.
+
+    Skipped when the active object is already in mode: the operator would still
+    run and push an undo step. Both cases are counted."""
+    obj = bpy.context.view_layer.objects.active
+    if (obj.mode if obj is not None else "OBJECT") == mode:
+        count("mode switches avoided")
+        return
+    count("mode switches")
+    with phase("mode switch"):
+        bpy.ops.object.mode_set(mode=mode)
+
+
+def store_profile(name, profiler):
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(40)
+    text = bpy.data.texts.get(PROFILE_TEXT) or bpy.data.texts.new(PROFILE_TEXT)
+    text.from_string(f"# cProfile of {name}\n" + out.getvalue())
+
+
+def as_dict():
+    return {
+        name: {"total": op.total.as_dict(), "phases": {p: r.as_dict() for p, r in op.phases.items()}, "counts": dict(op.counts)}
+        for name, op in stats.items()
+    }
+
+
+# ------------------- operators --------------#
+class ExportStats(bpy.types.Operator):
+    bl_idname = "fg.perf_export"
+    bl_label = "Export stats"
+    bl_description = "Write the operator timing stats to a JSON file"
+
+    filepath: bpy.props.StringProperty(subtype="FILE_PATH", default="fg_stats.json")
+
+    def invoke(self, context, event):
+        context.window_manager.fileselect_add(self)
+        return {"RUNNING_MODAL"}
+
+    def execute(self, context):
+        with open(bpy.path.abspath(self.filepath), "w") as f:
+            json.dump(as_dict(), f, indent=2)
+        self.report({"INFO"}, f"Stats written to {self.filepath}")
+        return {"FINISHED"}
+
+
+class ResetStats(bpy.types.Operator):
+    bl_idname = "fg.perf_reset"
+    bl_label = "Reset stats"
+    bl_description = "Forget the collected operator timings"
+
+    def execute(self, context):
+        stats.clear()
+        return {"FINISHED"}
+
+
+classes = [ExportStats, ResetStats]
+
+
+def register():
+    bpy.types.Scene.fg_profile_next = bpy.props.BoolProperty(
+        name="Profile next run", default=False, description="Capture a cProfile of the next Fg operator run into the fg_profile.txt text"
+    )
+    for cls in classes:
+        bpy.utils.register_class(cls)
+
+
+def unregister():
+    for cls in reversed(classes):
+        bpy.utils.unregister_class(cls)
+    del bpy.types.Scene.fg_profile_next
@@ -1,5 +1,21 @@
+import time
+
 import bpy
-import mathutils
+import numpy as np
+
+from ..core.capsule import capsule_hits, falloff_weights
+from ..core.geometry import point_segment_distance, pole_angle
+from ..core.landmarks import ARM_BONES, LEG_BONES, MIRROR_MODES, SPINE_BONES, find_landmarks, joint_deviation, marks_sides, rig_layout, side_bones
+from ..core.orientation import body_frame, floor_frame, to_frame
+from ..core.proxy import bounds, proxy_points
+from ..core.spatial import SpatialIndex
+from ..core.weights import clean_weights
+from .constraint_sync import sync_constraints
+from .ikchains import invalidate
+from .landmark_cache import clear_landmarks, get_landmarks, mesh_fingerprint, store_landmarks
+from .perf import mode_set, phase, timed
+from .session import enter, select_only, session
+from .vertex_data import add_group_weights, mesh_index, read_group_weights, world_coords, write_group_weights
 
 
 # ------------------- get_pole_angle --------------#
@@ -9,27 +25,125 @@ import mathutils
 # The pole bone is used to calculate the pole angle
 # The function returns the pole angle in radians
 # The pole angle is the angle between the base bone's x-axis and the projected pole axis on the base bone's plane
+# The math is core.geometry.pole_angle, this passes it the edit bone vectors
 def get_pole_angle(base, middle, pole):
-    def get_signed_angle(vector_u, vector_v, normal):
-
-        uv_angle = vector_u.angle(vector_v)
-
-        if vector_u.cross(vector_v) == mathutils.Vector((0, 0, 0)):
-            return uv_angle
-
-        if vector_u.cross(vector_v).angle(normal) < 1:
-            return -uv_angle
+    return pole_angle(base.head, base.tail, base.x_axis, middle.tail, pole.head)
+
+
+# ------------------- fit helpers --------------#
+# Shared by GenerateRig and the batch operator
+# fit_landmarks runs in OBJECT mode, write_rig_bones on the edit bones of an
+# armature that is already in EDIT mode, so a caller can fit many rigs per mode switch
+# Dense meshes are searched on a voxel proxy of at most proxy points, evaluated reads
+# the mesh with its modifiers applied; with compare the landmarks are also found on
+# every vertex and the largest joint shift is stored with the landmarks
+# The landmarks are measured in the body frame of the mesh (its principal axes with
+# orient BODY, the world axes with WORLD, the origin between the feet), stored as
+# marks["frame"]: the 4x4 matrix from that frame to world space. No transform of
+# the mesh or the armature is applied, the bones are written through the frame
+def fit_landmarks(human, use_cache=True, mirror="NONE", proxy=0, evaluated=False, compare=False, orient="BODY"):
+    """Return (landmarks, cached) for human, measured in its body frame."""
+    extra = (ORIENT_MODES.index(orient),)
+    if mirror != "NONE":
+        extra += (MIRROR_MODES.index(mirror),)
+    source = human.evaluated_get(bpy.context.evaluated_depsgraph_get()) if evaluated else human
+    if proxy or evaluated:
+        extra += (-1, proxy, int(evaluated))
+    if evaluated:
+        # the base mesh fingerprint does not see the modifiers
+        extra += (len(source.data.vertices), *(c for corner in source.bound_box for c in corner))
+    with phase("landmark cache"):
+        key = mesh_fingerprint(human, extra)
+        # a comparison is a fresh fit on both resolutions
+        marks = get_landmarks(human, key) if use_cache and not compare else None
+    if marks is not None:
+        return marks, True
+    with phase("vertex extract"):
+        if evaluated:
+            mesh = source.to_mesh()
+            coords = world_coords(human, mesh)
+            source.to_mesh_clear()
+        else:
+            coords = world_coords(human)
+    with phase("orientation"):
+        frame = body_frame(coords) if orient == "BODY" else floor_frame(coords)
+        coords = to_frame(coords, frame)
+        low, high = bounds(coords)
+        tall = (high[2] - low[2]) / 57
+        width = (high[0] - low[0]) / 2
+    with phase("voxel proxy"):
+        points, voxel = proxy_points(coords, proxy)
+    with phase("landmark search"):
+        marks = find_landmarks(SpatialIndex(points, tall), tall, width, mirror)
+    marks["frame"] = frame.ravel().tolist()
+    if voxel:
+        marks["proxy"] = {"points": len(points), "vertices": len(coords), "voxel": voxel}
+        if compare:
+            with phase("full resolution check"):
+                full = find_landmarks(SpatialIndex(coords, tall), tall, width, mirror)
+                marks["proxy"]["deviation"] = max(joint_deviation(marks, full).values())
+    with phase("landmark cache"):
+        store_landmarks(human, key, marks)
+    return marks, False
+
+
+def write_rig_bones(editbones, marks, matrix=None):
+    """Place the spine, arm and leg edit bones on marks, creating missing spine bones.
+
+    matrix (4x4) maps the landmark frame to armature space, the frames are the same
+    when it is None. Returns the limb sides written, a right side is skipped when
+    the armature lacks its bones."""
+    sides = [side for side in marks_sides(marks) if side == "L" or all(bn in editbones for bn in side_bones(ARM_BONES + LEG_BONES, side))]
+    with phase("edit bone write"):
+        for i, bn in enumerate(SPINE_BONES):
+            if not bn in editbones:
+                editbones.new(bn)
+            editbones[bn].roll = 0
+            editbones[bn].use_deform = True
+            if i != 0:
+                editbones[bn].use_connect = True
+                editbones[bn].parent = editbones[SPINE_BONES[i - 1]]
+            editbones[bn].color.palette = "THEME04"
 
-        return uv_angle
+        # ---- arms and legs keep the envelope of their previous length
+        for side in sides:
+            for bones, palette in ((ARM_BONES, "THEME05"), (LEG_BONES, "THEME11")):
+                for bn in side_bones(bones, side):
+                    editbones[bn].color.palette = palette
+                    editbones[bn].envelope_distance = editbones[bn].length / 4
+
+        writes = rig_layout(marks, sides)
+        coords = np.array([co for _, _, co in writes], dtype=np.float64)
+        if matrix is not None:
+            matrix = np.asarray(matrix, dtype=np.float64)
+            coords = coords @ matrix[:3, :3].T + matrix[:3, 3]
+        for (bn, end, _), co in zip(writes, coords.tolist()):
+            setattr(editbones[bn], end, co)
+        if matrix is not None:
+            # roll 0 in the landmark frame: the bone Z axis towards the body front
+            front = matrix[:3, :3] @ (0, -1, 0)
+            for bn in SPINE_BONES:
+                editbones[bn].align_roll(front.tolist())
+
+        for bn in SPINE_BONES:
+            editbones[bn].envelope_distance = editbones[bn].length / 4
+    return sides
 
-    pole_location = pole.head
 
-    pole_normal = (middle.tail - base.head).cross(pole_location - base.head)
-    projected_pole_axis = pole_normal.cross(base.vector)
+PROXY_POINTS = 50000
+PROXY_DESCRIPTION = "Find the landmarks on a voxel proxy of at most this many points, fewer is faster and coarser, 0 uses every vertex"
 
-    pole_angle = get_signed_angle(base.x_axis, projected_pole_axis, base.vector)
+ORIENT_MODES = ("BODY", "WORLD")
+ORIENT_ITEMS = [
+    ("BODY", "Body axes", "Find the up and front of the mesh from its principal axes, for imports in any orientation"),
+    ("WORLD", "World axes", "The mesh stands Z up and faces -Y in world space"),
+]
 
-    return pole_angle
+MIRROR_ITEMS = [
+    ("NONE", "Left only", "Fit the left limbs only"),
+    ("AUTO", "Auto", "Mirror the left limbs onto the right when the mesh is symmetric, fit both sides otherwise"),
+    ("BOTH", "Both sides", "Fit the left and right limbs separately"),
+]
 
 
 # ------------------- generate rig --------------#
@@ -41,10 +155,15 @@ class GenerateRig(bpy.types.Operator):
     bl_description = "Generate rig bones position"
     bl_options = {"REGISTER", "UNDO"}
 
+    use_cache: bpy.props.BoolProperty(name="Use landmark cache", default=True, description="Reuse the landmarks cached on an unchanged mesh")
+    mirror: bpy.props.EnumProperty(name="Mirror", items=MIRROR_ITEMS, default="AUTO")
+    proxy: bpy.props.IntProperty(name="Proxy points", default=PROXY_POINTS, min=0, description=PROXY_DESCRIPTION)
+    evaluated: bpy.props.BoolProperty(name="Use modifiers", default=False, description="Find the landmarks on the mesh with its modifiers applied")
+    compare: bpy.props.BoolProperty(name="Compare with full resolution", default=False, description="Also fit every vertex and report how far the proxy moved the joints")
+    orient: bpy.props.EnumProperty(name="Orientation", items=ORIENT_ITEMS, default="BODY")
+
+    @timed
     def execute(self, context):
-        mode = bpy.context.object.mode
-        bpy.ops.object.mode_set(mode="OBJECT")
-        bpy.ops.object.select_all(action="DESELECT")
         if not hasattr(context.scene, "my_object") or context.scene.my_object is None:
             self.report({"ERROR"}, "No object set in the scene")
             return {"CANCELLED"}
@@ -54,172 +173,51 @@ class GenerateRig(bpy.types.Operator):
 
         human = context.scene.my_object
         armatur = context.scene.my_armature
-        armatur.select_set(True)
-        bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
-        bpy.context.view_layer.objects.active = armatur
-        bpy.context.object.data.pose_position = "REST"
-        editbones = armatur.data.edit_bones
-        bonenames = [bn.name for bn in editbones]
-
-        human.select_set(True)
-        bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
-        tall = human.dimensions[2] / 57
-        width = human.dimensions[0] / 2
-        deep = human.dimensions[1]
-
-        center = tall * 30.5
-        armlocz = tall * 47
-        armlocx = 0
-        # 3. Axis vectors
-        x_axis = mathutils.Vector((1, 0, 0))
-        y_axis = mathutils.Vector((0, 1, 0))
-        z_axis = mathutils.Vector((0, 0, 1))
-
-        matrixworld = human.matrix_world
-        allverts = [matrixworld @ v.co for v in human.data.vertices]
-        allverts2 = [v for v in human.data.vertices if v.co.x > 0]
-
-        verts = [v for v in allverts if abs(v.x) < 0.1]
-        uppest = max(verts, key=lambda v: v.z)
-        # print("uppest: ", uppest)  # uppest:  <Vector (0.0006, -0.0340, 1.6413)>
-        bones = ["spine", "spine.001", "spine.002", "spine.003", "spine.004", "spine.005", "spine.006"]
-        lengths = [2.5, 3, 6.5, 4.5, 2.5, 1.5, 6]
-        ypos = [0.5, 0, -0.3, 0, 1.2, 0.5, 0.08]
-
-        # arms =["shoulder.L","upper_arm.L","forearm.L","hand.L"]
-        # armlen=[6,10,8,3]
-        bpy.ops.object.mode_set(mode="EDIT")
-        i = 0
-        for bn in bones:
-
-            if not bn in bonenames:
-                editbones.new(bn)
-            editbones[bn].head.x = 0
-            editbones[bn].tail.x = 0
-            # editbones[bn].head.y = 0
-
-            editbones[bn].roll = 0
-            editbones[bn].use_deform = True
-            if i != 0:
-                editbones[bn].use_connect = True
-                editbones[bones[i]].parent = editbones[bones[i - 1]]
+        with session(context, armatur, "EDIT"):
+            armatur.data.pose_position = "REST"
+            try:
+                marks, cached = fit_landmarks(human, self.use_cache, self.mirror, self.proxy, self.evaluated, self.compare, self.orient)
+            except ValueError as e:
+                # a limb the landmark search found no vertices around
+                armatur.data.pose_position = "POSE"
+                self.report({"ERROR"}, str(e))
+                return {"CANCELLED"}
+            # landmark frame -> world -> armature space
+            frame = np.array(marks["frame"], dtype=np.float64).reshape(4, 4)
+            matrix = np.linalg.inv(np.array(armatur.matrix_world, dtype=np.float64)) @ frame
+            sides = write_rig_bones(armatur.data.edit_bones, marks, matrix)
+            armatur.data.pose_position = "POSE"
+        source = "cached landmarks" if cached else "new landmarks"
+        if "R" in sides:
+            source += ", right side " + ("mirrored" if marks["mirror"] == "SYMMETRIC" else "fitted")
+        elif marks.get("mirror"):
+            source += ", no right side bones"
+        if "proxy" in marks:
+            source += f", {marks['proxy']['points']} of {marks['proxy']['vertices']} points"
+            if "deviation" in marks["proxy"]:
+                source += f", joints within {marks['proxy']['deviation']:.4f} of full resolution"
+        elif self.compare:
+            # the mesh fits the proxy budget (or the budget is 0), the fit is the full resolution one
+            source += ", proxy not used, joints within 0.0000 of full resolution"
+        self.report({"INFO"}, f"Rig created for armature: {armatur.name} ({source})")
+        return {"FINISHED"}
 
-            editbones[bn].head.z = center
-            center += lengths[i] * tall
-            editbones[bn].tail.z = center
-            editbones[bn].color.palette = "THEME04"
 
-            verty = [v for v in verts if abs(editbones[bn].head.z - v.z) < tall / 2 and abs(editbones[bn].head.x - v.x) < tall / 2]
-            maxy = max(verty, key=lambda v: v.y).y
-            miny = min(verty, key=lambda v: v.y).y
-            if not maxy and not miny:
-                editbones[bn].head.y = ypos[i] * tall + uppest.y
-                editbones[bn].tail.y = ypos[i] * tall + uppest.y
-            else:
-                editbones[bn].head.y = maxy * 0.55 + miny * 0.45
-                editbones[bn].tail.y = maxy * 0.55 + miny * 0.45
-                # print("maxy: ", maxy, "miny: ", miny)
+# ------------------- clear landmark cache --------------#
+# Drop the landmarks cached on the selected object
+class ClearLandmarkCache(bpy.types.Operator):
+    bl_idname = "fg.clear_landmark_cache"
+    bl_label = "Clear landmark cache"
+    bl_description = "Forget the landmarks cached on the object, the next Generate RIG analyses the mesh again"
+    bl_options = {"REGISTER", "UNDO"}
 
-            editbones[bn].envelope_distance = editbones[bn].length / 4
-            # print(editbones[bn], editbones[bn].length)
-            i += 1
-
-        #********************************************************#
-        # ----------------------------------arms------------------#
-        # allverts2 = [v for v in human.data.vertices if v.co.x > 0]
-        arms = ["shoulder.L", "upper_arm.L", "forearm.L", "hand.L"]
-        armsh = []
-        for arm in arms:
-            armsh.append(editbones[arm])
-            editbones[arm].color.palette = "THEME05"
-            editbones[arm].envelope_distance = editbones[arm].length / 4
-
-        # --------------arm pit ------shoulder------
-       
-
-        allv = [v for v in allverts2 if v.co.x> tall*3.5]
-        zz = max(allv, key=lambda v: v.co.z )
-        zzz=zz.co.copy()
-        zzz.x += tall
-        zzz.z -= tall*2
-        
-        armsh[1].head = zzz
-        armsh[0].tail = armsh[1].head
-        armsh[0].head = armsh[1].head + mathutils.Vector((-tall * 4, 0, 0))
-        armsh[0].tail.z += tall
-
-        # -----hand---------------
-
-        handvert = [v.co for v in allverts2 if abs(v.co.x - width) < tall]
-        handy = max(handvert, key=lambda v: v.x)
-        handz = max(handvert, key=lambda v: v.z)
-        armz=zzz-handz
-        # handy.y = handy.y - tall * 2
-        editbones["hand.L"].tail = handy
-
-        # --------------------elbow-------------
-
-        midelbow = editbones["upper_arm.L"].head * 0.5 + editbones["hand.L"].tail * 0.5
-        # print("mid1elbow: ", midelbow)
-        elbowvert = [v.co for v in allverts2 if abs(v.co.x - midelbow.x) < tall and abs(v.co.z - midelbow.z) < tall]
-        # for v in allverts2:
-        #     if abs(v.co.x - midelbow.x) < tall and abs(v.co.z - midelbow.z) < tall:
-        #         v.select = True
-        elbowymx = max(elbowvert, key=lambda v: v.y)
-        elbowymn = min(elbowvert, key=lambda v: v.y)
-        elbowy = elbowymx * 0.5 + elbowymn * 0.5
-        editbones["upper_arm.L"].tail = elbowy
-
-        wristvert = [v for v in allverts if abs(v.x - (width * 0.9)) < tall]
-        wristy = max(wristvert, key=lambda v: v.y)
-        wristy.y = wristy.y - tall
-        editbones["forearm.L"].tail = wristy
-
-        # -------------------legs-------------------------------#
-        legs = ["thigh.L", "shin.L", "foot.L", "toe.L"]
-        legsh = []
-        for leg in legs:
-            legsh.append(editbones[leg])
-            editbones[leg].color.palette = "THEME11"
-            editbones[leg].envelope_distance = editbones[leg].length / 4
-        # ------------------------thigh------
-        legsh[0].head = editbones["spine"].head
-        legsh[0].head.x = 2.5 * tall
-        #---------shin----------knee----------------
-        kneevert = [v for v in allverts if abs(v.z - tall * 15) < tall and v.x > 0]
-        kneey = min(kneevert, key=lambda v: v.y)
-        kneey.y = kneey.y + tall
-        legsh[0].tail = kneey
-        #----------------ankle-foot----------------
-        anklevert = [v for v in allverts if abs(v.z - tall * 4) < tall and v.x > 0]
-        anklez = min(anklevert, key=lambda v: v.y)
-        anklez.y = anklez.y + tall * 1.5
-        legsh[1].tail = anklez
-        #-----------------foot---toe-------------
-        toevert = [v for v in allverts if abs(v.z - tall) < tall and v.x > 0]
-        toey = min(toevert, key=lambda v: v.y)
-        toey.y = toey.y + tall * 2
-        legsh[2].tail = toey
-        legsh[3].tail = toey - mathutils.Vector((0, 2 * tall, 0))
-
-        # for bn in arms:
-        #     if not bn in orjbn:
-        #         editbones.new(bn)
-        #     if j>0:
-        #         editbones[bn].parent = editbones[arms[j-1]]
-        #     editbones[bn].head.z = armlocz
-        #     editbones[bn].tail.z = armlocz
-
-        #     editbones[bn].head.x=armlocx
-        #     armlocx += armlen[j]*tall
-        #     editbones[bn].tail.x = armlocx
-
-        #     editbones[bn].use_connect =True
-
-        #     j += 1
-        bpy.context.object.data.pose_position = "POSE"
-        bpy.ops.object.mode_set(mode=mode)
-        self.report({"INFO"}, f"Rig created for armature: {armatur.name}")
+    def execute(self, context):
+        human = context.scene.my_object
+        if human is None:
+            self.report({"ERROR"}, "No object set in the scene")
+            return {"CANCELLED"}
+        count = clear_landmarks(human)
+        self.report({"INFO"}, f"Cleared {count} cached landmark sets from {human.name}")
         return {"FINISHED"}
 
 
@@ -231,73 +229,78 @@ class GenerateIk(bpy.types.Operator):
     bl_description = "Generate ik bones for arm or leg"
     bl_options = {"REGISTER", "UNDO"}
 
+    @timed
     def execute(self, context):
-        bpy.context.object.pose.use_mirror_x = False
-        bpy.context.object.data.pose_position = "REST"
-
-        bpy.ops.object.mode_set(mode="EDIT")
-        bpy.context.object.data.use_mirror_x = False
-        edit_bones = context.object.data.edit_bones
-        activebone = context.active_bone  # context.object.data.edit_bones.active
-        ac = edit_bones.get(activebone.name)
-
-        base = activebone.parent
-        dir = (ac.vector - base.vector).normalized()
-        # dir.z = 0
-        # dir.x = 0
-        if not base:
-            self.report({"ERROR"}, "No parent bone to ik bone")
-            return {"CANCELLED"}
-        if not ac:
-            self.report({"ERROR"}, "No ik bone selected")
-            return {"CANCELLED"}
-
-        # generate ik bone and place it
-        activebonename = activebone.name
-        bones = [bn.name for bn in edit_bones]
-        ikbonename = "ik_" + activebone.name
-        polebonename = "pole_" + activebone.name
-        if not ikbonename in bones:
-            ikbone = edit_bones.new(name=ikbonename)
-        else:
-            ikbone = edit_bones[ikbonename]
-        if not polebonename in bones:
-            polebone = edit_bones.new(name=polebonename)
-        else:
-            polebone = edit_bones[polebonename]
-
-        ikbone.use_deform = False
-        ikbone.head = activebone.tail
-        if activebone.tail[2] > 0.66:
-            t = 1
-        else:
-            t = -1
-        ikbone.tail = ikbone.head + t * dir * 0.1
-
-        # generate pole bone and place it
-        polebone.use_deform = False
-        polebone.head = base.tail + dir * ac.length * -3
-        polebone.tail = polebone.head + dir * 0.1
-        pol_angle = get_pole_angle(edit_bones[activebonename].parent, edit_bones[activebonename], edit_bones[polebonename])
-
-        bpy.ops.object.mode_set(mode="POSE")
-        activepbone = context.object.pose.bones[activebonename]
-        if not "ik_" + activebonename in activepbone.constraints:
-            cons = activepbone.constraints.new(type="IK")
-            cons.name = "ik_" + activebonename
-        else:
-            cons = activepbone.constraints["ik_" + activebonename]
+        # one EDIT pass for the bones, one POSE pass for the constraint, then back
+        with session(context, context.object, "EDIT"):
+            bpy.context.object.pose.use_mirror_x = False
+            bpy.context.object.data.pose_position = "REST"
+
+            bpy.context.object.data.use_mirror_x = False
+            edit_bones = context.object.data.edit_bones
+            activebone = context.active_bone  # context.object.data.edit_bones.active
+            ac = edit_bones.get(activebone.name)
+
+            base = activebone.parent
+            dir = (ac.vector - base.vector).normalized()
+            # dir.z = 0
+            # dir.x = 0
+            if not base:
+                self.report({"ERROR"}, "No parent bone to ik bone")
+                return {"CANCELLED"}
+            if not ac:
+                self.report({"ERROR"}, "No ik bone selected")
+                return {"CANCELLED"}
+
+            # generate ik bone and place it
+            activebonename = activebone.name
+            bones = [bn.name for bn in edit_bones]
+            ikbonename = "ik_" + activebone.name
+            polebonename = "pole_" + activebone.name
+            if not ikbonename in bones:
+                ikbone = edit_bones.new(name=ikbonename)
+            else:
+                ikbone = edit_bones[ikbonename]
+            if not polebonename in bones:
+                polebone = edit_bones.new(name=polebonename)
+            else:
+                polebone = edit_bones[polebonename]
 
-        cons.target = context.object
-        cons.subtarget = ikbonename
-        cons.pole_target = context.object
-        cons.pole_subtarget = polebonename
-        cons.pole_angle = pol_angle
-        # print("uv_angle: ", cons.pole_angle)
-        cons.chain_count = context.scene.chain_count
-        cons.use_stretch = False
+            # the height test and the control lengths are in world units, the rig keeps its
+            # transform (an FBX import at 0.01 scale, a turned character)
+            world = context.object.matrix_world
+            length = 0.1 / max(world.to_scale())
 
-        bpy.context.object.data.pose_position = "POSE"
+            ikbone.use_deform = False
+            ikbone.head = activebone.tail
+            if (world @ activebone.tail).z > 0.66:
+                t = 1
+            else:
+                t = -1
+            ikbone.tail = ikbone.head + t * dir * length
+
+            # generate pole bone and place it
+            polebone.use_deform = False
+            polebone.head = base.tail + dir * ac.length * -3
+            polebone.tail = polebone.head + dir * length
+            pol_angle = get_pole_angle(edit_bones[activebonename].parent, edit_bones[activebonename], edit_bones[polebonename])
+
+            mode_set("POSE")
+            activepbone = context.object.pose.bones[activebonename]
+            spec = {
+                "target": context.object,
+                "subtarget": ikbonename,
+                "pole_target": context.object,
+                "pole_subtarget": polebonename,
+                "pole_angle": pol_angle,
+                "chain_count": context.scene.chain_count,
+                "use_stretch": False,
+            }
+            added, updated, removed = sync_constraints(activepbone, [("ik_" + activebonename, "IK", spec)])
+            if added or updated:
+                invalidate(context.object)
+
+            bpy.context.object.data.pose_position = "POSE"
 
         # bpy.context.view_layer.update()
         self.report({"INFO"}, f"Ik bone created: {ikbonename}")
@@ -311,60 +314,181 @@ class Autoparent(bpy.types.Operator):
     bl_label = "parent them"
     bl_options = {"REGISTER", "UNDO"}
 
+    method: bpy.props.EnumProperty(
+        name="Weights",
+        items=[
+            ("HEAT", "Heat", "Blender automatic weights (bone heat), slow and may fail on dense scans"),
+            ("DISTANCE", "Distance", "Bone capsule distance falloff over each bone's envelope distance"),
+        ],
+        default="HEAT",
+    )
+
+    @timed
     def execute(self, context):
-        mode = bpy.context.object.mode
-        aktiv = bpy.context.active_object
-        bpy.ops.object.mode_set(mode="OBJECT")
-        bpy.ops.object.select_all(action="DESELECT")
+        if self.method == "DISTANCE":
+            return self.parent_distance(context)
         human = context.scene.my_object
         armatur = context.scene.my_armature
 
-        human.select_set(True)
-        bpy.ops.object.parent_clear(type="CLEAR_KEEP_TRANSFORM")
-        bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
+        # bone heat is sensitive to object transforms, this path still applies them
+        with session(context, human, "OBJECT", [human]):
+            bpy.ops.object.parent_clear(type="CLEAR_KEEP_TRANSFORM")
+            bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
 
-        armatur.select_set(True)
-        bpy.context.view_layer.objects.active = armatur
-        bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
-        bpy.context.object.data.pose_position = "REST"
+            select_only(context, [human, armatur], armatur)
+            bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
+            armatur.data.pose_position = "REST"
 
-        original_scale = armatur.scale.copy()
-        human_scale = human.scale.copy()
-        # --- Apply temporary scale (2x) ---
-        armatur.scale = [s * 10 for s in original_scale]
-        human.scale = [s * 10 for s in human_scale]
-        # bpy.context.view_layer.update()
+            original_scale = armatur.scale.copy()
+            human_scale = human.scale.copy()
+            # --- Apply temporary scale (2x) ---
+            armatur.scale = [s * 10 for s in original_scale]
+            human.scale = [s * 10 for s in human_scale]
+            # bpy.context.view_layer.update()
 
-        bpy.ops.object.parent_set(type="ARMATURE_AUTO")
+            bpy.ops.object.parent_set(type="ARMATURE_AUTO")
 
-        armatur.scale = original_scale
+            armatur.scale = original_scale
 
-        # bpy.context.view_layer.update()
-        bpy.context.object.data.pose_position = "POSE"
-        bpy.context.view_layer.objects.active = human
-        bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
-        bpy.ops.object.mode_set(mode="OBJECT")
-        bpy.ops.object.select_all(action="DESELECT")
-        bpy.context.view_layer.objects.active = aktiv
-        bpy.ops.object.mode_set(mode=mode)
+            # bpy.context.view_layer.update()
+            armatur.data.pose_position = "POSE"
+            context.view_layer.objects.active = human
+            bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
         self.report({"INFO"}, f"Lets parent anyway")
         return {"FINISHED"}
 
+    def parent_distance(self, context):
+        start = time.perf_counter()
+        human = context.scene.my_object
+        armatur = context.scene.my_armature
+        if human is None or armatur is None:
+            self.report({"ERROR"}, "Set object and armature first")
+            return {"CANCELLED"}
+
+        with session(context, human, "OBJECT", [human]):
+            try:
+                weighted, bones = distance_parent(human, armatur)
+            except ValueError as e:
+                self.report({"ERROR"}, str(e))
+                return {"CANCELLED"}
+        self.report({"INFO"}, f"Weighted {weighted} vertices to {bones} bones in {time.perf_counter() - start:.2f}s")
+        return {"FINISHED"}
+
+
+# ------------------- distance parent --------------#
+# Weight human to the deform bones of armatur by capsule distance and parent it
+# Works on the data only (OBJECT mode, no operators), raises ValueError when the
+# mesh cannot be fully weighted so nothing is parented half way
+def distance_parent(human, armatur):
+    """Weight, parent and add an Armature modifier, return (weighted vertices, deform bones)."""
+    deform = [bn for bn in armatur.data.bones if bn.use_deform]
+    if not deform:
+        raise ValueError(f"No deform bones in {armatur.name}")
+    if not human.data.vertices:
+        raise ValueError(f"{human.name} has no vertices")
+
+    matrix = armatur.matrix_world
+    heads = np.array([matrix @ bn.head_local for bn in deform], dtype=np.float32)
+    tails = np.array([matrix @ bn.tail_local for bn in deform], dtype=np.float32)
+    falloffs = [bn.envelope_distance for bn in deform]
+    with phase("vertex extract"):
+        coords = world_coords(human)
+    with phase("weights"):
+        rows, cols, weights = falloff_weights(coords, heads, tails, falloffs)
+    weighted = len(np.unique(rows))
+    if weighted != len(human.data.vertices):
+        raise ValueError(f"Only {weighted} of {len(human.data.vertices)} vertices got weights")
+
+    with phase("group write"):
+        order = np.argsort(cols, kind="stable")
+        rows, cols, weights = rows[order], cols[order], weights[order]
+        bounds = np.searchsorted(cols, np.arange(len(deform) + 1))
+        for i, bn in enumerate(deform):
+            write_group_weights(human, bn.name, rows[bounds[i] : bounds[i + 1]], weights[bounds[i] : bounds[i + 1]])
+
+    world = human.matrix_world.copy()
+    human.parent = armatur
+    human.matrix_world = world
+    modifier = next((m for m in human.modifiers if m.type == "ARMATURE"), None)
+    if modifier is None:
+        modifier = human.modifiers.new(name=armatur.name, type="ARMATURE")
+    modifier.object = armatur
+    modifier.use_vertex_groups = True
+    return weighted, len(deform)
+
+
+# ------------------- clean weights --------------#
+# Normalize, limit influences and prune the vertex groups of the object
+class CleanWeights(bpy.types.Operator):
+    bl_idname = "fg.clean_weights"
+    bl_label = "clean weights"
+    bl_description = "Normalize the deform bone weights, keep the strongest influences per vertex and drop small weights"
+    bl_options = {"REGISTER", "UNDO"}
+
+    limit: bpy.props.IntProperty(name="Max influences", default=4, min=1, max=32)
+    threshold: bpy.props.FloatProperty(name="Threshold", default=0.01, min=0.0, max=1.0)
+    normalize: bpy.props.BoolProperty(name="Normalize", default=True)
+
+    @timed
+    def execute(self, context):
+        human = context.scene.my_object
+        armatur = context.scene.my_armature
+        if human is None or not human.vertex_groups:
+            self.report({"ERROR"}, "Object has no vertex groups")
+            return {"CANCELLED"}
+        if armatur is None:
+            self.report({"ERROR"}, "No armature set in the scene")
+            return {"CANCELLED"}
+        # only the groups of deform bones, like Blender's "Deform Pose Bones" subset
+        deform = {bn.name for bn in armatur.data.bones if bn.use_deform}
+        bone_groups = np.array([vg.name in deform for vg in human.vertex_groups], dtype=bool)
+        if not bone_groups.any():
+            self.report({"ERROR"}, f"No vertex groups of {armatur.name} deform bones")
+            return {"CANCELLED"}
+        with session(context, human, "OBJECT", [human]):
+            start = time.perf_counter()
+            with phase("group read"):
+                rows, cols, weights = read_group_weights(human)
+                bones = bone_groups[cols]
+                rows, cols, weights = rows[bones], cols[bones], weights[bones]
+                locked = np.array([vg.lock_weight for vg in human.vertex_groups], dtype=bool)[cols]
+                # the free weights fill what the locked ones leave over
+                targets = 1 - np.bincount(rows[locked], weights[locked], minlength=len(human.data.vertices))
+                np.clip(targets, 0, 1, out=targets)
+                rows, cols, weights = rows[~locked], cols[~locked], weights[~locked]
+            read = time.perf_counter()
+
+            with phase("weights"):
+                keep, cleaned = clean_weights(rows, cols, weights, self.limit, self.threshold, self.normalize, targets)
+                changed = keep & (cleaned != weights)
+            clean = time.perf_counter()
+
+            with phase("group write"):
+                order = np.argsort(cols, kind="stable")
+                bounds = np.searchsorted(cols[order], np.arange(len(human.vertex_groups) + 1))
+                for i, group in enumerate(human.vertex_groups):
+                    part = order[bounds[i] : bounds[i + 1]]
+                    removed = part[~keep[part]]
+                    if len(removed):
+                        group.remove(rows[removed].tolist())
+                    updated = part[changed[part]]
+                    # exact weights, so normalized vertices sum to their target
+                    add_group_weights(group, rows[updated], cleaned[updated], levels=None)
+            write = time.perf_counter()
+
+        self.report(
+            {"INFO"},
+            f"Removed {int((~keep).sum())} and changed {int(changed.sum())} weights "
+            f"(read {read - start:.2f}s, clean {clean - read:.2f}s, write {write - clean:.2f}s)",
+        )
+        return {"FINISHED"}
+
 
 # ------------------- weight paint auto --------------#
 # Calculate the distance from a point to a line segment defined by two endpoints
 def point_line_distance(point, line_start, line_end):
     """Calculate the distance from a point to a line segment defined by two endpoints."""
-    line_vector = line_end - line_start
-    point_vector = point - line_start
-    line_length_squared = line_vector.length_squared
-
-    if line_length_squared == 0:
-        return (point - line_start).length
-
-    t = max(0, min(1, point_vector.dot(line_vector) / line_length_squared))
-    projection = line_start + t * line_vector
-    return (point - projection).length
+    return point_segment_distance(point, line_start, line_end)
 
 
 class Weightpaintauto(bpy.types.Operator):
@@ -372,40 +496,41 @@ class Weightpaintauto(bpy.types.Operator):
     bl_label = "auto weight paint"
     bl_options = {"REGISTER", "UNDO"}
 
+    threshold: bpy.props.FloatProperty(
+        name="Distance", default=0.01, min=0.0, soft_max=0.2, subtype="DISTANCE", description="Select vertices closer than this to a selected bone"
+    )
+
+    @timed
     def execute(self, context):
-        bpy.ops.object.mode_set(mode="OBJECT")
-        bpy.ops.object.select_all(action="DESELECT")
+        # leaving any EDIT mode stores the bone selection on the armature data
+        mode_set("OBJECT")
         human = context.scene.my_object
         armatur = context.scene.my_armature
-        # human.select_set(True)
-        armatur.select_set(True)
-        bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
-        bpy.context.view_layer.objects.active = armatur
-        verts = [v for v in human.data.vertices]
-        # for v in verts:
-        #     v.select=False
-        bpy.ops.object.mode_set(mode="EDIT")
-        bpy.context.object.data.pose_position = "REST"
-
-        bns = context.selected_editable_bones
-        for bn in bns:
-            for v in verts:
-                world_co = human.matrix_world @ v.co
-                headco = armatur.matrix_world @ bn.head
-                tailco = armatur.matrix_world @ bn.tail
-                if abs(point_line_distance(world_co, headco, tailco)) <= 0.01:
-                    v.select = True
-        bpy.ops.object.mode_set(mode="OBJECT")
-        bpy.ops.object.select_all(action="DESELECT")
-        bpy.context.view_layer.objects.active = human
-        bpy.ops.object.mode_set(mode="EDIT")
+
+        matrix = armatur.matrix_world
+        bns = [bn for bn in armatur.data.bones if bn.select and not bn.hide]
+        heads = np.array([matrix @ bn.head_local for bn in bns], dtype=np.float32).reshape(-1, 3)
+        tails = np.array([matrix @ bn.tail_local for bn in bns], dtype=np.float32).reshape(-1, 3)
+
+        vertices = human.data.vertices
+        select = np.empty(len(vertices), dtype=bool)
+        vertices.foreach_get("select", select)
+        with phase("vertex extract"):
+            index, coords = mesh_index(human)
+        with phase("capsule query"):
+            for head, tail in zip(heads, tails):
+                select[capsule_hits(index, coords, head, tail, self.threshold)] = True
+        vertices.foreach_set("select", select)
+
+        # ends in EDIT mode on the mesh to show the selection
+        enter(context, human, "EDIT", [human])
         return {"FINISHED"}
 
     ############################################
 
 
 # ------------------ register -------------------#
-classes = [GenerateIk, GenerateRig, Weightpaintauto, Autoparent]
+classes = [GenerateIk, GenerateRig, ClearLandmarkCache, Weightpaintauto, Autoparent, CleanWeights]
 
 
 def register():
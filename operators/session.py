@@ -0,0 +1,56 @@
+from contextlib import contextmanager
+
+from .perf import mode_set
+
+
+# ------------------- object session --------------#
+# Mode and selection handling shared by the operators
+# Selection goes through select_set on the objects whose state changes, never a
+# select_all pass over the scene. enter() leaves the current mode only when the
+# active object changes, so staying on the same object switches straight between
+# modes (or not at all, mode_set skips and counts a switch to the current mode)
+# session() wraps a block in enter() and puts the previous active object, selection
+# and mode back afterwards; mode toggles call enter() alone and stay in the new mode
+def select_only(context, objects, active=None):
+    """Select exactly objects and active, make active the active object."""
+    view_objects = context.view_layer.objects
+    keep = {obj for obj in objects if obj.name in view_objects}
+    if active is not None:
+        keep.add(active)
+    for obj in context.selected_objects:
+        if obj not in keep:
+            obj.select_set(False)
+    for obj in keep:
+        if not obj.select_get():
+            obj.select_set(True)
+    view_objects.active = active
+
+
+def enter(context, active, mode, objects=()):
+    """Make active the active object in mode, with only objects and active selected."""
+    current = context.view_layer.objects.active
+    # objects of the active object's type share its EDIT or POSE session
+    if current != active or any(obj.mode != current.mode for obj in objects if obj.type == active.type):
+        mode_set("OBJECT")
+    select_only(context, objects, active)
+    mode_set(mode)
+
+
+@contextmanager
+def session(context, active, mode, objects=()):
+    """Run the block with active in mode and objects selected, then restore the previous state."""
+    view_objects = context.view_layer.objects
+    previous = view_objects.active
+    previous_mode = previous.mode if previous is not None else "OBJECT"
+    selected = list(context.selected_objects)
+    enter(context, active, mode, objects)
+    try:
+        yield active
+    finally:
+        if view_objects.active != previous:
+            mode_set("OBJECT")
+        if previous is not None and previous.name not in view_objects:
+            previous = None
+        select_only(context, selected, previous)
+        if previous is not None:
+            mode_set(previous_mode)
@@ -0,0 +1,125 @@
+import bpy
+import numpy as np
+from bpy.app.handlers import persistent
+
+from ..core.spatial import SpatialIndex
+
+
+# ------------------- vertex data --------------#
+# Bulk vertex access shared by the rig operators
+# Coordinates are pulled with foreach_get into one float32 array and moved to
+# world space with a single matrix product, so no per-vertex Python objects are made
+def local_coords(mesh):
+    """Return the vertex coordinates of mesh as an (N, 3) float32 array."""
+    count = len(mesh.vertices)
+    coords = np.empty(count * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", coords)
+    return coords.reshape(count, 3)
+
+
+def world_coords(obj, mesh=None):
+    """Return the world space vertex coordinates of obj as an (N, 3) float32 array."""
+    coords = local_coords(mesh if mesh is not None else obj.data)
+    matrix = np.array(obj.matrix_world, dtype=np.float32)
+    return coords @ matrix[:3, :3].T + matrix[:3, 3]
+
+
+# ------------------- vertex index --------------#
+# SpatialIndex over the world space vertices, kept until the mesh geometry changes
+# Entries are dropped by a depsgraph handler on geometry updates of the object or
+# its mesh, a new object matrix or vertex count is checked on every lookup
+MAX_INDEXES = 4
+_indexes = {}
+
+
+def mesh_index(obj):
+    """Return (SpatialIndex, world coords) of obj, rebuilding them only when the mesh changed."""
+    key = (obj.data.as_pointer(), len(obj.data.vertices), tuple(c for row in obj.matrix_world for c in row))
+    cached = _indexes.get(obj.as_pointer())
+    if cached is not None and cached[0] == key:
+        return cached[1], cached[2]
+    coords = world_coords(obj)
+    # cell 0: the grid is as fine as SpatialIndex.max_cells allows
+    index = SpatialIndex(coords, 0)
+    _indexes.pop(obj.as_pointer(), None)
+    while len(_indexes) >= MAX_INDEXES:
+        _indexes.pop(next(iter(_indexes)))
+    _indexes[obj.as_pointer()] = (key, index, coords)
+    return index, coords
+
+
+def invalidate(obj=None):
+    """Drop the vertex index of obj, or every index."""
+    if obj is None:
+        _indexes.clear()
+    else:
+        _indexes.pop(obj.as_pointer(), None)
+
+
+@persistent
+def _on_depsgraph_update(scene, depsgraph):
+    if not _indexes:
+        return
+    changed = {update.id.original.as_pointer() for update in depsgraph.updates if update.is_updated_geometry}
+    if changed:
+        for key in [k for k, entry in _indexes.items() if k in changed or entry[0][0] in changed]:
+            del _indexes[key]
+
+
+@persistent
+def _on_load(*args):
+    invalidate()
+
+
+def register():
+    bpy.app.handlers.depsgraph_update_post.append(_on_depsgraph_update)
+    bpy.app.handlers.load_post.append(_on_load)
+
+
+def unregister():
+    if _on_load in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(_on_load)
+    if _on_depsgraph_update in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(_on_depsgraph_update)
+    invalidate()
+
+
+# ------------------- vertex group writes --------------#
+# Vertex groups have no foreach_set, weights are quantized into levels and each
+# level is written with one VertexGroup.add call over all its vertices
+# levels None writes the exact float weights, one add call per distinct value
+# Entries whose weight is (or rounds to) 0 are removed rather than left as they were
+WEIGHT_LEVELS = 256
+
+
+def write_group_weights(obj, name, indices, weights, levels=WEIGHT_LEVELS):
+    """Replace the weights of vertex group name on obj with weights at indices."""
+    group = obj.vertex_groups.get(name) or obj.vertex_groups.new(name=name)
+    group.remove(range(len(obj.data.vertices)))
+    add_group_weights(group, indices, weights, levels)
+    return group
+
+
+def add_group_weights(group, indices, weights, levels=WEIGHT_LEVELS):
+    """Set weights at indices of group, one add call per quantized level (or exact value)."""
+    weights = np.asarray(weights, dtype=np.float32)
+    steps = weights if levels is None else np.rint(weights * (levels - 1)).astype(np.int64)
+    order = np.argsort(steps, kind="stable")
+    steps, indices = steps[order], np.asarray(indices)[order]
+    bounds = np.flatnonzero(np.diff(steps)) + 1
+    for level, members in zip(steps[np.r_[0, bounds]] if len(steps) else [], np.split(indices, bounds)):
+        if not level:
+            group.remove(members.tolist())
+        else:
+            group.add(members.tolist(), float(level) if levels is None else level / (levels - 1), "REPLACE")
+
+
+def read_group_weights(obj):
+    """Return (vertex indices, group indices, weights) of every vertex group entry of obj.
+
+    There is no bulk getter for vertex weights, this is the one Python pass over them."""
+    entries = [(v.index, g.group, g.weight) for v in obj.data.vertices for g in v.groups]
+    if not entries:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    rows, cols, weights = zip(*entries)
+    return np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64), np.array(weights, dtype=np.float32)
@@ -1,29 +1,40 @@
 import bpy
 
+from ..operators.bonehash import bone_head_hash, rest_revision
+from ..operators import perf
+from ..operators.ikchains import find_chain
+
 
 # 🧠 Enum generator callback
+# Blender calls this on every redraw, the items are memoized per armature, active
+# bone and rest pose revision. The lists stay referenced in _bone_items because
+# Blender does not copy the enum strings
+NOT_ARMATURE = [("", "Not an armature", "")]
+NO_BONE = [("", "No bone selected", "")]
+NO_CHILD = [("", "No child bone found", "")]
+MAX_ITEMS = 64
+_bone_items = {}
+
+
 def get_bone_items(self, context):
     # pose mode
     obj = context.object
     if not obj or obj.type != "ARMATURE":
-        return [("", "Not an armature", "")]
+        return NOT_ARMATURE
 
     objbone = context.active_pose_bone
-    bones = obj.pose.bones
+    if not objbone or not obj.pose.bones:
+        return NO_BONE
 
-    if not objbone or not bones:
-        return [("", "No bone selected", "")]
-
-    objbones = []
-    for bone in bones:
-        head = bone.bone.head_local
-        tail = objbone.bone.tail_local
-        if abs(head.x - tail.x) < 0.01 and abs(head.y - tail.y) < 0.01 and abs(head.z - tail.z) < 0.01:
-            objbones.append(bone)
-
-    if not objbones:
-        return [("", "No child bone found", "")]
-    return [(bone.name, bone.name, "") for bone in objbones]
+    key = (obj.data.as_pointer(), objbone.name, rest_revision(obj.data))
+    items = _bone_items.get(key)
+    if items is None:
+        names = bone_head_hash(obj.data).at(objbone.bone.tail_local)
+        items = [(name, name, "") for name in names] or NO_CHILD
+        while len(_bone_items) >= MAX_ITEMS:
+            _bone_items.pop(next(iter(_bone_items)))
+        _bone_items[key] = items
+    return items
 
 
 class VIEW3D_PT_Selecting(bpy.types.Panel):
@@ -61,6 +72,12 @@ class VIEW3D_PT_Selecting(bpy.types.Panel):
         row.label(text="Armature:")
         row.prop(scene, "my_armature", text="")
         row.separator()
+
+        row = layout.row(align=True)
+        row.alignment = "LEFT"
+        row.label(text="Crowd:")
+        row.prop(scene, "fg_batch_collection", text="")
+        row.operator("fg.batch_generate_rig", text="", icon="COMMUNITY")
         layout.separator()
 
 
@@ -85,7 +102,10 @@ class VIEW3D_PT_Rig_Orienting(bpy.types.Panel):
             col = layout.column(align=True)
             row = col.row(align=True)
             row.operator("fg.generate_rig", text=f"Generate RIG", icon="CONSTRAINT_BONE")
+            row.operator("fg.clear_landmark_cache", text="", icon="TRASH")
             row.operator("fg.autoparent", text="auto parent", icon="RIGHTARROW_THIN")
+            row.operator("fg.autoparent", text="", icon="MOD_VERTEX_WEIGHT").method = "DISTANCE"
+            row.operator("fg.clean_weights", text="", icon="BRUSH_DATA")
             layout.separator()
 
             row = layout.row()
@@ -102,12 +122,15 @@ class VIEW3D_PT_Rig_Orienting(bpy.types.Panel):
             row.label(text=" ::: Snap ::: ")
             row = layout.row(align=True)
             row.operator("fg.ikorfksnap", text="IK or FK", icon="SNAP_ON")
-            # row.scale_x = 0.4
-            # if context.active_pose_bone.constraints:
-            #     for con in context.active_pose_bone.constraints:
-            #         if con.type == "IK":
-            #             row.prop(con, "influence", text="", icon_only=True)
-            #             break
+            row.operator("fg.ikorfksnap", text="", icon="GROUP_BONE").scope = "ALL"
+            row.operator("fg.ikorfksnap", text="", icon="REC").bake = "RANGE"
+            pbone = context.active_pose_bone
+            if pbone and context.object.type == "ARMATURE":
+                chain, ikbones = find_chain(context.object, pbone.name)
+                con = ikbones[0].constraints.get(chain.constraint) if chain else None
+                if con:
+                    row.scale_x = 0.4
+                    row.prop(con, "influence", text="", icon_only=True)
 
             row.separator()
 
@@ -168,6 +191,9 @@ class VIEW3D_PT_Twist_Fix(bpy.types.Panel):
             row = layout.row()
             row.operator("fg.up_twist_armleg", text="twist up")
             row.prop(context.active_bone, "name", text="", icon_only=True)
+
+            row = layout.row()
+            row.operator("fg.twist_limbs", text="twist all limbs", icon="MOD_SCREW")
             # row.label(text="", icon="GIZMO")
 
             # layout.separator()
@@ -176,8 +202,40 @@ class VIEW3D_PT_Twist_Fix(bpy.types.Panel):
             row = layout.row()
 
 
+class VIEW3D_PT_Performance(bpy.types.Panel):
+    "5"
+
+    bl_label = "Performance"
+    bl_idname = "VIEW3D_PT_Performance"
+    bl_space_type = "VIEW_3D"
+    bl_region_type = "UI"
+    bl_category = "Fg"
+    bl_options = {"DEFAULT_CLOSED"}
+
+    def draw(self, context):
+        layout = self.layout
+        row = layout.row(align=True)
+        row.prop(context.scene, "fg_profile_next", text="Profile next", icon="TIME")
+        row.operator("fg.perf_export", text="", icon="EXPORT")
+        row.operator("fg.perf_reset", text="", icon="TRASH")
+
+        if not perf.stats:
+            layout.label(text="Run an operator to collect timings")
+            return
+        for name, op in perf.stats.items():
+            total = op.total.as_dict()
+            box = layout.box()
+            box.label(text=f"{name}  x{total['calls']}  last {total['last'] * 1000:.1f} ms  mean {total['mean'] * 1000:.1f} ms")
+            col = box.column(align=True)
+            for phase, rolling in sorted(op.phases.items(), key=lambda item: -item[1].as_dict()["mean"]):
+                timing = rolling.as_dict()
+                col.label(text=f"   {phase}: {timing['last'] * 1000:.1f} ms (mean {timing['mean'] * 1000:.1f} ms)")
+            if op.counts:
+                col.label(text="   " + ", ".join(f"{name} {amount}" for name, amount in sorted(op.counts.items())))
+
+
 # 🔁 Register
-classes = [VIEW3D_PT_Selecting, VIEW3D_PT_Rig_Orienting, VIEW3D_PT_Smart_Modes, VIEW3D_PT_Twist_Fix]
+classes = [VIEW3D_PT_Selecting, VIEW3D_PT_Rig_Orienting, VIEW3D_PT_Smart_Modes, VIEW3D_PT_Twist_Fix, VIEW3D_PT_Performance]
 
 props = [
     ("bone_enum", bpy.props.EnumProperty(name="Child Bone", description="Choose hand or foot bone to fix twist", items=get_bone_items)),
@@ -188,6 +246,7 @@ props = [
             name="Armature", type=bpy.types.Object, poll=lambda self, obj: obj.type == "ARMATURE", description="Select an Armature"
         ),
     ),
+    ("fg_batch_collection", bpy.props.PointerProperty(name="Crowd", type=bpy.types.Collection, description="Collection of meshes rigged by the batch operator")),
     ("chain_count", bpy.props.IntProperty(name="", default=2, min=1, max=10, description="Number of bones in the chain"))
 ]
 